@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+from urllib.parse import urljoin, urlparse
+
+# 各網域已記錄的卡片資料 API：{網域: {頁面 URL: [端點, ...]}}
+ENDPOINTS_PATH = os.path.join('data', 'api_endpoints.json')
+
+# 卡片記錄中常見的欄位名稱
+NAME_KEYS = re.compile(r'(card_?name|name|title)$', re.IGNORECASE)
+IMAGE_KEYS = re.compile(r'(img|image|pic|photo)', re.IGNORECASE)
+LINK_KEYS = re.compile(r'(url|link|href)$', re.IGNORECASE)
+CARD_WORDS = re.compile(r'(卡|card)', re.IGNORECASE)
+
+_enabled = False
+_lock = threading.Lock()
+_endpoints = None
+
+
+def set_enabled(enabled):
+    """開啟或關閉 API 擷取模式（擷取需要 Chrome performance log）"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_logging(chrome_options):
+    """讓 Chrome 記錄網路流量，供 capture() 讀取"""
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def _load():
+    global _endpoints
+    if _endpoints is None:
+        _endpoints = {}
+        if os.path.exists(ENDPOINTS_PATH):
+            try:
+                with open(ENDPOINTS_PATH, 'r', encoding='utf-8') as f:
+                    _endpoints = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"無法讀取 API 紀錄 {ENDPOINTS_PATH}: {e}")
+    return _endpoints
+
+
+def _save():
+    directory = os.path.dirname(ENDPOINTS_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{ENDPOINTS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_endpoints, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, ENDPOINTS_PATH)
+
+
+def _looks_like_card(record):
+    """記錄是否像一張卡片：有名稱欄位，且內容提到卡片"""
+    has_name = any(NAME_KEYS.search(key) for key in record)
+    mentions_card = any(isinstance(value, str) and CARD_WORDS.search(value) for value in record.values())
+    return has_name and mentions_card
+
+
+def find_card_records(data, path=()):
+    """在 JSON 中找出最像卡片清單的陣列，回傳 (路徑, 記錄列表)；找不到時回傳 (None, [])"""
+    best_path, best_records = None, []
+    if isinstance(data, list):
+        records = [item for item in data if isinstance(item, dict)]
+        matched = [item for item in records if _looks_like_card(item)]
+        if len(matched) >= 2 and len(matched) >= len(records) / 2:
+            best_path, best_records = list(path), records
+        for index, item in enumerate(data[:5]):
+            # 只檢查前幾個元素內的巢狀陣列，避免在大型回應中遍歷過久
+            sub_path, sub_records = find_card_records(item, path + (index,))
+            if len(sub_records) > len(best_records):
+                best_path, best_records = sub_path, sub_records
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            sub_path, sub_records = find_card_records(value, path + (key,))
+            if len(sub_records) > len(best_records):
+                best_path, best_records = sub_path, sub_records
+    return best_path, best_records
+
+
+def _extract(data, path):
+    for key in path:
+        data = data[key]
+    return data
+
+
+def capture(driver, page_url):
+    """讀取頁面載入期間的網路流量，記錄回傳卡片資料的 JSON API"""
+    try:
+        entries = driver.get_log('performance')
+    except Exception as e:
+        print(f"無法讀取 performance log: {e}")
+        return []
+
+    requests_by_id = {}
+    json_responses = []
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        params = message.get('params', {})
+        if message.get('method') == 'Network.requestWillBeSent':
+            request = params.get('request', {})
+            requests_by_id[params.get('requestId')] = {
+                'url': request.get('url'),
+                'method': request.get('method', 'GET'),
+                'body': request.get('postData'),
+                'content_type': request.get('headers', {}).get('Content-Type'),
+            }
+        elif message.get('method') == 'Network.responseReceived':
+            response = params.get('response', {})
+            if 'json' in (response.get('mimeType') or '') and response.get('status') == 200:
+                json_responses.append(params.get('requestId'))
+
+    found = []
+    for request_id in json_responses:
+        request = requests_by_id.get(request_id)
+        if not request or not request['url']:
+            continue
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            data = json.loads(body.get('body', ''))
+        except Exception:
+            continue
+        path, records = find_card_records(data)
+        if records:
+            print(f"找到卡片資料 API（{len(records)} 筆）: {request['url']}")
+            found.append(dict(request, path=path))
+
+    if found:
+        with _lock:
+            host = urlparse(page_url).netloc
+            _load().setdefault(host, {})[page_url] = found
+            _save()
+    return found
+
+
+def _field(record, pattern, exclude=None):
+    for key, value in record.items():
+        if exclude is not None and exclude.search(key):
+            continue
+        if pattern.search(key) and isinstance(value, str) and value:
+            return value
+    return None
+
+
+def records_to_markdown(records):
+    """將卡片記錄轉為 Markdown，方便與一般頁面內容一起整合分析"""
+    lines = []
+    for record in records:
+        lines.append(f"### {_field(record, NAME_KEYS) or ''}")
+        for key, value in record.items():
+            if isinstance(value, (str, int, float)) and value != '':
+                lines.append(f"- {key}: {value}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def replay(page_url):
+    """以一般 HTTP 請求重放已記錄的 API，跳過 Selenium 與 Gemini
+
+    回傳 (markdown, creditCards, related_links)；沒有紀錄或重放失敗時回傳 None
+    """
+    if not _enabled:
+        return None
+    host = urlparse(page_url).netloc
+    with _lock:
+        endpoints = list(_load().get(host, {}).get(page_url, []))
+    if not endpoints:
+        return None
+
+    import requests
+
+    all_records = []
+    for endpoint in endpoints:
+        try:
+            headers = {"User-Agent": "Mozilla/5.0", "Accept": "application/json", "Referer": page_url}
+            if endpoint.get('content_type'):
+                headers['Content-Type'] = endpoint['content_type']
+            response = requests.request(endpoint.get('method', 'GET'), endpoint['url'],
+                                        data=endpoint.get('body'), headers=headers, timeout=20)
+            response.raise_for_status()
+            records = _extract(response.json(), endpoint['path'])
+        except Exception as e:
+            print(f"重放 API 失敗，改用瀏覽器爬取: {endpoint['url']} ({e})")
+            # 端點已失效，移除紀錄，下次重新擷取
+            with _lock:
+                _load().get(host, {}).pop(page_url, None)
+                _save()
+            return None
+        all_records.extend(record for record in records if isinstance(record, dict))
+
+    credit_cards = []
+    related_links = []
+    for record in all_records:
+        name = _field(record, NAME_KEYS)
+        image = _field(record, IMAGE_KEYS)
+        link = _field(record, LINK_KEYS, exclude=IMAGE_KEYS)
+        credit_cards.append({
+            'cardName': name or '',
+            'imageUrl': urljoin(page_url, image) if image else '',
+        })
+        if link and not link.startswith('javascript:'):
+            related_links.append({
+                'title': name or '',
+                'url': urljoin(page_url, link),
+                'description': '',
+                'imageUrl': urljoin(page_url, image) if image else '',
+                'relevance': '高',
+            })
+    print(f"使用已記錄的 API 取得 {len(all_records)} 筆卡片資料: {page_url}")
+    return records_to_markdown(all_records), credit_cards, related_links
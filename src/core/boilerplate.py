@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, unquote_plus
+
+# 每個網域的重複區塊統計，持久化後下一次執行一開始就能去除
+MODEL_PATH = os.path.join('data', 'boilerplate.json')
+# 區塊至少出現在幾個頁面、且佔該網域頁面的比例達多少，才視為樣板內容
+MIN_PAGES = 3
+MIN_RATIO = 0.5
+# 太短的區塊（例如標題）不列入統計
+MIN_BLOCK_CHARS = 20
+
+# 追蹤用的網址參數
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|dclid|msclkid|_ga|_gl|mc_\w+|yclid|spm)$', re.IGNORECASE)
+# javascript: 連結，允許一層括號，例如 javascript:void(0)、javascript:open('a')
+JS_LINK = re.compile(r'\[([^\]]*)\]\(\s*javascript:(?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+# Markdown 連結與圖片的網址，以及選用的標題，例如 [t](url "title")
+LINK_TARGET = re.compile(r'\]\(\s*<?([^)\s>]+)>?(\s+"[^"]*")?\s*\)')
+# 已帶有 scheme（http:、mailto:、data: 等）的網址
+HAS_SCHEME = re.compile(r'^[a-zA-Z][\w+.-]*:')
+
+_lock = threading.Lock()
+_model = None
+_observed_urls = set()
+
+
+def _load():
+    global _model
+    if _model is None:
+        _model = {}
+        if os.path.exists(MODEL_PATH):
+            try:
+                with open(MODEL_PATH, 'r', encoding='utf-8') as f:
+                    _model = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"無法讀取樣板模型 {MODEL_PATH}: {e}")
+    return _model
+
+
+def split_blocks(markdown):
+    """以空行切分 Markdown 區塊"""
+    return re.split(r'\n\s*\n', markdown)
+
+
+def block_key(block):
+    """區塊的比對鍵（忽略空白差異）"""
+    normalized = ' '.join(block.split())
+    if len(normalized) < MIN_BLOCK_CHARS:
+        return None
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def observe(url, markdown):
+    """記錄頁面中出現的區塊，學習該網域在各頁面重複出現的樣板內容"""
+    host = urlparse(url).netloc
+    keys = {key for key in (block_key(block) for block in split_blocks(markdown)) if key}
+    with _lock:
+        if url in _observed_urls:
+            return
+        _observed_urls.add(url)
+        stats = _load().setdefault(host, {'pages': 0, 'blocks': {}})
+        stats['pages'] += 1
+        for key in keys:
+            stats['blocks'][key] = stats['blocks'].get(key, 0) + 1
+
+
+def _is_boilerplate(stats, key):
+    count = stats['blocks'].get(key, 0)
+    return count >= MIN_PAGES and count / stats['pages'] >= MIN_RATIO
+
+
+def strip(url, markdown, seen_blocks=None):
+    """去除頁面中的樣板區塊
+
+    傳入 seen_blocks 時，每個樣板區塊保留第一次出現的那份（例如整合多個頁面內容時），
+    否則全部去除（例如單頁送給 Gemini 分析時）
+    """
+    host = urlparse(url).netloc
+    with _lock:
+        stats = _load().get(host)
+        if not stats:
+            return markdown
+        kept = []
+        for block in split_blocks(markdown):
+            key = block_key(block)
+            if key and _is_boilerplate(stats, key):
+                if seen_blocks is None or (host, key) in seen_blocks:
+                    continue
+                seen_blocks.add((host, key))
+            kept.append(block)
+    return '\n\n'.join(kept)
+
+
+def save():
+    """寫回樣板模型，只保留出現兩次以上的區塊以控制檔案大小"""
+    with _lock:
+        if not _model:
+            return
+        compact = {
+            host: {
+                'pages': stats['pages'],
+                'blocks': {key: count for key, count in stats['blocks'].items() if count >= 2}
+            }
+            for host, stats in _model.items()
+        }
+        directory = os.path.dirname(MODEL_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{MODEL_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(compact, f)
+        os.replace(tmp_path, MODEL_PATH)
+
+
+def strip_tracking_params(url):
+    """移除 utm_*、fbclid 等追蹤參數
+
+    其餘參數保留原本的編碼與順序；沒有追蹤參數時回傳原網址，避免改變簽章網址等對編碼敏感的網址
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.query:
+        return url
+    segments = parts.query.split('&')
+    kept = [segment for segment in segments if not TRACKING_PARAMS.match(unquote_plus(segment.split('=', 1)[0]))]
+    if len(kept) == len(segments):
+        return url
+    return urlunsplit(parts._replace(query='&'.join(kept)))
+
+
+def resolve_url(url, base_url):
+    """以頁面網址解析相對網址；已帶有 scheme 的網址與頁內錨點維持不變"""
+    if not base_url or HAS_SCHEME.match(url) or url.startswith('#'):
+        return url
+    return urljoin(base_url, url)
+
+
+def resolve_urls(markdown, base_url):
+    """將 Markdown 連結與圖片的相對網址換成以 base_url 解析後的完整網址"""
+    return LINK_TARGET.sub(lambda m: f"]({resolve_url(m.group(1), base_url)}{m.group(2) or ''})", markdown)
+
+
+def compact_urls(markdown, base_url=None):
+    """將 Markdown 中的網址換成短代號（URL1、URL2…），回傳 (新內容, 代號對照表)
+
+    javascript: 連結只保留文字；相同網址（去除追蹤參數後）使用同一個代號；
+    傳入 base_url 時相對網址先解析為完整網址，對照表中只有完整網址
+    """
+    mapping = {}
+    ids = {}
+
+    def shorten(url):
+        url = strip_tracking_params(resolve_url(url, base_url))
+        if url not in ids:
+            ids[url] = f"URL{len(ids) + 1}"
+            mapping[ids[url]] = url
+        return ids[url]
+
+    # 移除 javascript: 連結，只保留連結文字
+    markdown = JS_LINK.sub(r'\1', markdown)
+    # Markdown 連結與圖片的網址（保留標題）
+    markdown = LINK_TARGET.sub(lambda m: f"]({shorten(m.group(1))}{m.group(2) or ''})", markdown)
+    # 其餘裸露的網址
+    markdown = re.sub(r'(?<![(\w])https?://[^\s)\]>"]+', lambda m: shorten(m.group(0)), markdown)
+    return markdown, mapping
+
+
+def expand_urls(text, mapping, json_escape=False):
+    """將回應中的短代號換回原本的網址；json_escape 為 True 時網址會依 JSON 字串規則跳脫"""
+    if not mapping:
+        return text
+
+    def expand(match):
+        url = mapping.get(match.group(0))
+        if url is None:
+            return match.group(0)
+        return json.dumps(url, ensure_ascii=False)[1:-1] if json_escape else url
+
+    return re.sub(r'\bURL\d+\b', expand, text)
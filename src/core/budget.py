@@ -0,0 +1,94 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class LocalCounters:
+    """單一程序內使用的計數器（多執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+            return self._values[name]
+
+    def get_counter(self, name):
+        with self._lock:
+            return self._values.get(name, 0)
+
+
+class CrawlBudget:
+    """爬取預算：總頁數、每個網域頁數、截止時間與 Gemini 輸入/輸出 token 數
+
+    計數器可由共享佇列提供（frontier 的 incr / get_counter），讓所有 worker 共用同一份預算；
+    任何一項用盡後 exhausted() 會回傳原因，爬取流程據此停止擴展，但保留已取得的結果
+    """
+
+    def __init__(self, max_pages=None, max_pages_per_host=None, max_seconds=None,
+                 max_input_tokens=None, max_output_tokens=None, deadline=None, counters=None):
+        self.max_pages = max_pages
+        self.max_pages_per_host = max_pages_per_host
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        # 截止時間以絕對時間保存，分散式 worker 才能共用同一個期限
+        if deadline is None and max_seconds is not None:
+            deadline = time.time() + max_seconds
+        self.deadline = deadline
+        self.counters = counters if counters is not None else LocalCounters()
+
+    def to_config(self):
+        """轉為可放進 frontier 設定的 dict"""
+        return {
+            'max_pages': self.max_pages,
+            'max_pages_per_host': self.max_pages_per_host,
+            'max_input_tokens': self.max_input_tokens,
+            'max_output_tokens': self.max_output_tokens,
+            'deadline': self.deadline,
+        }
+
+    @classmethod
+    def from_config(cls, config, counters=None):
+        if not config:
+            return None
+        return cls(counters=counters, **config)
+
+    def exhausted(self):
+        """回傳已用盡的預算名稱，尚有預算時回傳 None"""
+        if self.deadline is not None and time.time() >= self.deadline:
+            return "時間"
+        if self.max_pages is not None and self.counters.get_counter('pages') >= self.max_pages:
+            return "頁數"
+        if self.max_input_tokens is not None and self.counters.get_counter('input_tokens') >= self.max_input_tokens:
+            return "輸入 token"
+        if self.max_output_tokens is not None and self.counters.get_counter('output_tokens') >= self.max_output_tokens:
+            return "輸出 token"
+        return None
+
+    def try_acquire_page(self, url):
+        """為即將爬取的頁面預扣一頁額度，預算不足時回傳 False"""
+        if self.exhausted():
+            return False
+        if self.max_pages_per_host is not None:
+            host_key = f"host:{urlparse(url).netloc}"
+            if self.counters.incr(host_key) > self.max_pages_per_host:
+                self.counters.incr(host_key, -1)
+                return False
+        if self.max_pages is not None and self.counters.incr('pages') > self.max_pages:
+            self.counters.incr('pages', -1)
+            if self.max_pages_per_host is not None:
+                self.counters.incr(host_key, -1)
+            return False
+        if self.max_pages is None:
+            self.counters.incr('pages')
+        return True
+
+    def add_tokens(self, input_tokens, output_tokens):
+        self.counters.incr('input_tokens', input_tokens or 0)
+        self.counters.incr('output_tokens', output_tokens or 0)
+
+    def summary(self):
+        return (f"已爬取 {self.counters.get_counter('pages')} 頁，"
+                f"Gemini 輸入 {self.counters.get_counter('input_tokens')} / 輸出 {self.counters.get_counter('output_tokens')} tokens")
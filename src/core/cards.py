@@ -0,0 +1,82 @@
+import json
+import re
+import unicodedata
+from collections import Counter
+
+# 儲存 URL 的欄位，合併時優先採用完整網址
+URL_FIELDS = ("imageUrl", "cardImage", "cardLink")
+
+
+def normalize_text(text):
+    """正規化文字（全形轉半形、小寫、移除空白與標點），用於比對卡片與優惠是否相同"""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"[\s\W_]+", "", text)
+
+
+def card_key(card):
+    """以正規化後的卡名與發卡銀行作為卡片的合併鍵"""
+    return normalize_text(card.get("cardName")), normalize_text(card.get("issuer"))
+
+
+def _item_key(item):
+    """優惠項目的去重鍵"""
+    if isinstance(item, dict):
+        return tuple(sorted((key, normalize_text(str(value))) for key, value in item.items()))
+    return normalize_text(str(item))
+
+
+def _pick_value(field, values):
+    """欄位衝突時的取捨：URL 欄位優先完整網址；其餘取出現最多次的值，同票時取較完整（較長）的值"""
+    values = [value for value in values if value not in (None, "", [], {})]
+    if not values:
+        return None
+    if field in URL_FIELDS:
+        absolute = [value for value in values if isinstance(value, str) and value.startswith(("http://", "https://"))]
+        if absolute:
+            values = absolute
+    if not all(isinstance(value, str) for value in values):
+        return values[0]
+    counts = Counter(normalize_text(value) for value in values)
+    return max(values, key=lambda value: (counts[normalize_text(value)], len(value), value))
+
+
+def _merge_group(cards):
+    merged = {}
+    fields = []
+    for card in cards:
+        for field in card:
+            if field not in fields:
+                fields.append(field)
+    for field in fields:
+        values = [card.get(field) for card in cards if field in card]
+        if any(isinstance(value, list) for value in values):
+            # 優惠等清單欄位：合併後去除重複項目
+            items = []
+            seen = set()
+            for value in values:
+                for item in value if isinstance(value, list) else []:
+                    key = _item_key(item)
+                    if key not in seen:
+                        seen.add(key)
+                        items.append(item)
+            merged[field] = items
+        else:
+            merged[field] = _pick_value(field, values)
+    return merged
+
+
+def merge_cards(card_lists):
+    """將多個來源的卡片清單合併為一份，結果不受清單的輸入順序影響
+
+    各清單先依內容排序後再依序合併（清單內的卡片與優惠維持原本的順序），欄位衝突時同票以值本身決定
+    """
+    groups = {}
+    ordered = sorted(card_lists, key=lambda cards: json.dumps(cards, ensure_ascii=False, sort_keys=True, default=str))
+    for cards in ordered:
+        for card in cards:
+            if not isinstance(card, dict) or not card.get("cardName"):
+                continue
+            groups.setdefault(card_key(card), []).append(card)
+    return [_merge_group(cards) for cards in groups.values()]
@@ -1,28 +1,36 @@
 import time
-import requests
-from bs4 import BeautifulSoup
-import html2text
-import cloudscraper
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
 from urllib.parse import urlparse
 import re
+import threading
+import core.storage as storage
+import core.boilerplate as boilerplate
+import core.api_capture as api_capture
+from core.retry import RetryPolicy, CircuitBreaker, FailureLog
+
+# selenium、cloudscraper、BeautifulSoup、html2text 載入較慢，只在實際爬取時才匯入，
+# 讓只讀取 data/ 的流程（例如沿用既有爬蟲結果重新分析）能快速啟動
 
 # 全域變數儲存瀏覽器實例
 _browser = None
-# 緩存已爬取的頁面，避免重複爬取
+# 緩存已爬取的頁面，避免重複爬取（只保存 PageRef，內容存在磁碟上）
 _page_cache = {}
-# 記錄失敗的 URL
+# 記錄本次執行失敗的 URL
 _failed_urls = set()
+# 持久化的失敗紀錄，過期前下一次執行也會略過
+_failure_log = FailureLog()
+# 重試策略與各網域的斷路器
+_retry_policy = RetryPolicy()
+_breaker = CircuitBreaker()
+_breaker_lock = threading.Lock()
+_checked_hosts = set()
 
 def get_browser():
     """獲取或建立瀏覽器實例"""
     global _browser
     if _browser is None:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
         chrome_options = Options()
         chrome_options.add_argument("--headless")  # 無頭模式
         chrome_options.add_argument("--start-maximized")  # 最大化窗口
@@ -37,6 +45,8 @@ def get_browser():
         chrome_options.add_argument("--disable-3d-apis")  # 禁用 3D API
         chrome_options.add_argument("--disable-webgl")  # 禁用 WebGL 
         chrome_options.add_argument("--ignore-certificate-errors")  # 忽略證書錯誤
+        if api_capture.is_enabled():
+            api_capture.enable_logging(chrome_options)  # 記錄網路流量以擷取卡片資料 API
         
         # 初始化 WebDriver
         _browser = webdriver.Chrome(options=chrome_options)
@@ -82,112 +92,179 @@ def is_similar_url(url1, url2):
     
     return path1_no_digits == path2_no_digits
 
-def url_to_markdown(url, use_selenium=False, retry_count=0):
+class RetryableFetchError(Exception):
+    """可重試的請求錯誤（例如 429 或 5xx 狀態碼）"""
+
+def _fetch_with_selenium(url):
+    """使用 Selenium 載入頁面並回傳 HTML"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    
+    driver = get_browser()  # 使用或建立瀏覽器實例
+    if api_capture.is_enabled():
+        # 清掉先前頁面留下的網路紀錄
+        try:
+            driver.get_log('performance')
+        except Exception:
+            pass
+    print(f"正在使用 Selenium 載入: {url}")
+    driver.get(url)
+    
+    # 等待頁面基本元素載入
+    try:
+        WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+    except TimeoutException:
+        print(f"等待 body 元素超時: {url}，但繼續處理頁面")
+    
+    # 等待頁面加載完成，但最多等待 10 秒
+    wait_time = 0
+    while driver.execute_script("return document.readyState") != "complete" and wait_time < 10:
+        time.sleep(1)
+        wait_time += 1
+        print(f"等待頁面載入中... {wait_time}/10 秒")
+    
+    # 記錄載入卡片資料的 JSON API，之後可直接重放
+    if api_capture.is_enabled():
+        api_capture.capture(driver, url)
+    
+    # 即使頁面未完全載入，也嘗試獲取當前內容
+    return driver.page_source
+
+def _fetch_with_scraper(url):
+    """使用 cloudscraper 取得頁面 HTML；無法取得時回傳 None"""
+    import cloudscraper
+    
+    scraper = cloudscraper.create_scraper(delay=3)  # 減少延遲
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Connection": "keep-alive",
+        "Upgrade-Insecure-Requests": "1"
+    }
+    
+    response = scraper.get(url, headers=headers, timeout=30)  # 增加超時時間
+    
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableFetchError(f"狀態碼: {response.status_code}")
+    if response.status_code != 200:
+        print(f"請求失敗: {url}, 狀態碼: {response.status_code}")
+        return None
+    
+    return response.content
+
+def _host_available(host):
+    """檢查網域的斷路器；上一次執行留下的網域封鎖紀錄在第一次遇到該網域時載入"""
+    with _breaker_lock:
+        if host not in _checked_hosts:
+            _checked_hosts.add(host)
+            blocked_until = _failure_log.host_blocked_until(host)
+            if blocked_until:
+                _breaker.trip(host, blocked_until)
+    return _breaker.allow(host)
+
+def _record_result(host, success):
+    """記錄請求結果到斷路器，並同步網域封鎖紀錄"""
+    if _breaker.record(host, success):
+        print(f"網域 {host} 錯誤率過高，暫停爬取該網域")
+        _failure_log.add_host(host, _breaker.open_until(host))
+    elif success:
+        _failure_log.remove_host(host)
+
+def _mark_failed(url):
+    _failed_urls.add(url)
+    _failure_log.add_url(url)
+
+def url_to_markdown(url, use_selenium=False):
     """將 URL 轉換為 Markdown 格式的內容"""
     global _page_cache, _failed_urls
     
-    # 如果 URL 已知失敗，直接返回
-    if url in _failed_urls:
+    # 如果 URL 已知失敗（包含上一次執行留下且尚未過期的紀錄），直接返回
+    if url in _failed_urls or _failure_log.is_failed(url):
         print(f"跳過已知失敗的 URL: {url}")
         return None
     
     # 檢查緩存
     if url in _page_cache:
         print(f"使用緩存: {url}")
-        return _page_cache[url]
+        return str(_page_cache[url])
     
     # 檢查是否有相似的 URL 已經爬取過
     for cached_url in _page_cache.keys():
         if is_similar_url(url, cached_url):
             print(f"使用相似 URL 的緩存: {url} -> {cached_url}")
-            return _page_cache[cached_url]
-    
-    # 最大重試次數
-    max_retries = 3
+            return str(_page_cache[cached_url])
     
+    host = urlparse(url).netloc
+    page_source = None
     if use_selenium:
-        # 使用 Selenium 模式
-        try:
-            driver = get_browser()  # 使用或建立瀏覽器實例
-            
+        from selenium.common.exceptions import WebDriverException
+        retryable_errors = (WebDriverException, RetryableFetchError)
+    else:
+        retryable_errors = (RetryableFetchError,)
+    
+    if not _host_available(host):
+        print(f"網域 {host} 暫停爬取中，略過: {url}")
+        return None
+    
+    # 以迴圈重試，每次失敗後依指數退避等待；重試全部結束後才以一次結果計入斷路器，
+    # 避免單一 URL 的多次重試就讓整個網域被暫停
+    success = False
+    try:
+        for attempt in range(_retry_policy.max_retries + 1):
             try:
-                print(f"正在使用 Selenium 載入: {url}")
-                driver.get(url)
-                
-                # 等待頁面基本元素載入
-                try:
-                    WebDriverWait(driver, 30).until(
-                        EC.presence_of_element_located((By.TAG_NAME, "body"))
-                    )
-                except TimeoutException:
-                    print(f"等待 body 元素超時: {url}，但繼續處理頁面")
-                
-                # 等待頁面加載完成，但最多等待 10 秒
-                wait_time = 0
-                while driver.execute_script("return document.readyState") != "complete" and wait_time < 10:
-                    time.sleep(1)
-                    wait_time += 1
-                    print(f"等待頁面載入中... {wait_time}/10 秒")
-                
-                # 即使頁面未完全載入，也嘗試獲取當前內容
-                page_source = driver.page_source
-                
-            except TimeoutException as e:
-                if retry_count < max_retries:
-                    print(f"載入 {url} 超時，嘗試重新啟動瀏覽器 (重試 {retry_count + 1}/{max_retries})")
-                    restart_browser()
-                    return url_to_markdown(url, use_selenium, retry_count + 1)
+                if use_selenium:
+                    page_source = _fetch_with_selenium(url)
                 else:
-                    print(f"載入 {url} 多次嘗試後仍然超時，放棄爬取")
-                    _failed_urls.add(url)
+                    page_source = _fetch_with_scraper(url)
+                    if page_source is None:
+                        # 網域有正常回應（例如 404），只記錄此 URL 失敗，斷路器計為成功
+                        success = True
+                        _mark_failed(url)
+                        return None
+                success = True
+                break
+            except retryable_errors as e:
+                if attempt >= _retry_policy.max_retries:
+                    print(f"處理 {url} 多次嘗試後仍然出錯: {e}")
+                    _mark_failed(url)
                     return None
+                delay = _retry_policy.delay(attempt)
+                print(f"載入 {url} 失敗: {e}，{delay:.1f} 秒後重試 ({attempt + 1}/{_retry_policy.max_retries})")
+                time.sleep(delay)
+                if use_selenium:
+                    restart_browser()
+            except Exception as e:
+                if use_selenium:
+                    # 與瀏覽器無關的錯誤，重試也無法解決
+                    print(f"Selenium 請求失敗: {e}")
+                    _mark_failed(url)
+                    return None
+                if attempt >= _retry_policy.max_retries:
+                    print(f"請求 {url} 多次嘗試後仍然失敗: {e}")
+                    _mark_failed(url)
+                    return None
+                delay = _retry_policy.delay(attempt)
+                print(f"請求 {url} 失敗: {e}，{delay:.1f} 秒後重試 ({attempt + 1}/{_retry_policy.max_retries})")
+                time.sleep(delay)
             
-        except WebDriverException as e:
-            if retry_count < max_retries:
-                print(f"瀏覽器異常: {e}，嘗試重新啟動瀏覽器 (重試 {retry_count + 1}/{max_retries})")
-                restart_browser()
-                return url_to_markdown(url, use_selenium, retry_count + 1)
-            else:
-                print(f"處理 {url} 多次嘗試後仍然出錯: {e}")
-                _failed_urls.add(url)
-                return None
-        except Exception as e:
-            print(f"Selenium 請求失敗: {e}")
-            _failed_urls.add(url)
-            return None
-    else:
-        # 使用 cloudscraper 替代 requests
-        try:
-            scraper = cloudscraper.create_scraper(delay=3)  # 減少延遲
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1"
-            }
-            
-            response = scraper.get(url, headers=headers, timeout=30)  # 增加超時時間
-            
-            if response.status_code != 200:
-                print(f"請求失敗: {url}, 狀態碼: {response.status_code}")
-                _failed_urls.add(url)
-                return None
-            
-            page_source = response.content
-            
-        except Exception as e:
-            if retry_count < max_retries:
-                print(f"請求 {url} 失敗: {e}，重試 ({retry_count + 1}/{max_retries})")
-                time.sleep(3)  # 等待幾秒再重試
-                return url_to_markdown(url, use_selenium, retry_count + 1)
-            else:
-                print(f"請求 {url} 多次嘗試後仍然失敗: {e}")
-                _failed_urls.add(url)
+            # 等待期間其他 URL 的結果可能已讓斷路器打開
+            if _breaker.is_open(host):
+                print(f"網域 {host} 暫停爬取中，停止重試: {url}")
                 return None
+    finally:
+        # 每個 URL 只記錄一次結果；所有離開路徑都會記錄，確保半開狀態的試探請求一定會被釋放
+        _record_result(host, success)
 
     # 其餘邏輯保持不變，但優化處理
     try:
+        from bs4 import BeautifulSoup
+        import html2text
+        
         soup = BeautifulSoup(page_source, "html.parser")
 
         # 移除不需要的元素，加快處理速度
@@ -238,8 +315,11 @@ def url_to_markdown(url, use_selenium=False, retry_count=0):
 
         print(f"成功爬取: {url}")
         
-        # 儲存到緩存
-        _page_cache[url] = markdown_content
+        # 儲存到緩存（內容寫入磁碟，記憶體中只留參照）
+        _page_cache[url] = storage.put_page(markdown_content)
+        
+        # 學習此網域各頁面重複出現的樣板內容
+        boilerplate.observe(url, markdown_content)
         
         return markdown_content
     except Exception as e:
@@ -256,8 +336,11 @@ def cleanup():
         print("失敗的 URL:")
         for url in _failed_urls:
             print(f" - {url}")
+    # 失敗紀錄寫入磁碟，過期前下一次執行仍會略過
+    _failure_log.save()
+    boilerplate.save()
     _page_cache = {}  # 清空緩存
-    _failed_urls = set()  # 清空失敗記錄
+    _failed_urls = set()  # 清空本次的失敗記錄
 
 # print(url_to_markdown("https://news.google.com/home?hl=zh-TW&gl=TW&ceid=TW:zh-Hant"))
 
@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 任務被領取後若超過此秒數仍未完成，視為 worker 已失效並重新排入佇列
+DEFAULT_LEASE_SECONDS = 600
+
+
+class SQLiteFrontier:
+    """以 SQLite 檔案（檔案鎖）實作的共享爬取佇列與已造訪集合，適用於同一台機器上的多個程序"""
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                url TEXT PRIMARY KEY,
+                depth INTEGER NOT NULL,
+                parent_url TEXT,
+                title TEXT,
+                priority REAL NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'queued',
+                claimed_at REAL,
+                worker TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks (state, priority);
+            CREATE TABLE IF NOT EXISTS records (url TEXT PRIMARY KEY, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+
+    def reset(self):
+        """清除上一次爬取留下的佇列與紀錄"""
+        with self._lock:
+            self._conn.executescript("DELETE FROM tasks; DELETE FROM records; DELETE FROM meta; DELETE FROM counters;")
+
+    def set_config(self, config):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('config', ?)",
+                               (json.dumps(config, ensure_ascii=False),))
+
+    def get_config(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def incr(self, name, amount=1):
+        """共享計數器（供爬取預算使用），回傳累加後的值"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+            row = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+            self._conn.execute("COMMIT")
+        return row[0]
+
+    def get_counter(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def push(self, url, depth, parent_url=None, title='', priority=0):
+        """加入待爬取的 URL，已造訪過（或已在佇列中）則回傳 False"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO tasks (url, depth, parent_url, title, priority) VALUES (?, ?, ?, ?, ?)",
+                (url, depth, parent_url, title, priority))
+        return cursor.rowcount > 0
+
+    def pop(self, worker_id=None):
+        """領取優先度最高的任務，沒有可領取的任務時回傳 None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 收回逾時未完成的任務
+                self._conn.execute(
+                    "UPDATE tasks SET state = 'queued', worker = NULL WHERE state = 'claimed' AND claimed_at < ?",
+                    (now - self.lease_seconds,))
+                row = self._conn.execute(
+                    "SELECT url, depth, parent_url, title, priority FROM tasks WHERE state = 'queued' "
+                    "ORDER BY priority DESC, rowid LIMIT 1").fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE tasks SET state = 'claimed', claimed_at = ?, worker = ? WHERE url = ?",
+                        (now, worker_id, row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {'url': row[0], 'depth': row[1], 'parent_url': row[2], 'title': row[3] or '', 'priority': row[4]}
+
+    def complete(self, url, record):
+        """回報任務完成並儲存頁面紀錄"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("INSERT OR REPLACE INTO records (url, data) VALUES (?, ?)",
+                               (url, json.dumps(record, ensure_ascii=False)))
+            self._conn.execute("UPDATE tasks SET state = 'done' WHERE url = ?", (url,))
+            self._conn.execute("COMMIT")
+
+    def fail(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET state = 'failed' WHERE url = ?", (url,))
+
+    def is_finished(self):
+        """佇列為空且沒有進行中的任務"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state IN ('queued', 'claimed')").fetchone()
+        return row[0] == 0
+
+    def records(self, batch_size=500):
+        """逐筆產生頁面紀錄，每次只從資料庫讀取一批，避免一次載入所有紀錄"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT rowid, data FROM records WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                          (last_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for rowid, data in rows:
+                yield json.loads(data)
+            last_rowid = rows[-1][0]
+
+    def close(self):
+        self._conn.close()
+
+
+# Redis 的多步驟操作以 Lua 腳本在伺服器端一次完成，其他 worker 不會看到中間狀態
+
+# KEYS: seen, tasks, priorities, queue, pending；ARGV: url, 任務 JSON, 優先度
+PUSH_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[1])
+redis.call('INCR', KEYS[5])
+return 1
+"""
+
+# KEYS: queue, inflight, tasks, priorities；ARGV: 目前時間, 租約到期的時間點
+POP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[2])
+for _, url in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], url)
+    redis.call('ZADD', KEYS[1], redis.call('HGET', KEYS[4], url) or 0, url)
+end
+local popped = redis.call('ZPOPMAX', KEYS[1])
+if #popped == 0 then
+    return false
+end
+redis.call('ZADD', KEYS[2], ARGV[1], popped[1])
+return redis.call('HGET', KEYS[3], popped[1])
+"""
+
+# KEYS: inflight, queue, done, pending, records；ARGV: url, 頁面紀錄 JSON（失敗時為空字串）
+FINISH_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[5], ARGV[1], ARGV[2])
+end
+if redis.call('SADD', KEYS[3], ARGV[1]) == 1 then
+    redis.call('DECR', KEYS[4])
+end
+return 1
+"""
+
+
+class RedisFrontier:
+    """以 Redis 實作的共享爬取佇列，適用於多台機器；client 可傳入任何相容 redis-py 介面的物件
+    
+    pending 計數器記錄尚未完成（排隊中或進行中）的任務數，push 時加一、第一次完成或失敗時減一，
+    is_finished 只需讀取這一個值
+    """
+
+    def __init__(self, client, prefix='deepcrawl', lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.client = client
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self._push = client.register_script(PUSH_SCRIPT)
+        self._pop = client.register_script(POP_SCRIPT)
+        self._finish = client.register_script(FINISH_SCRIPT)
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def reset(self):
+        """清除上一次爬取留下的佇列與紀錄"""
+        self.client.delete(*[self._key(name) for name in (
+            'config', 'seen', 'tasks', 'priorities', 'queue', 'inflight', 'pending', 'done', 'records', 'counters')])
+
+    def set_config(self, config):
+        self.client.set(self._key('config'), json.dumps(config, ensure_ascii=False))
+
+    def get_config(self):
+        value = self.client.get(self._key('config'))
+        return json.loads(self._text(value)) if value else {}
+
+    def incr(self, name, amount=1):
+        """共享計數器（供爬取預算使用），回傳累加後的值"""
+        return int(self.client.hincrby(self._key('counters'), name, amount))
+
+    def get_counter(self, name):
+        value = self.client.hget(self._key('counters'), name)
+        return int(self._text(value)) if value else 0
+
+    def push(self, url, depth, parent_url=None, title='', priority=0):
+        """加入待爬取的 URL，已造訪過（或已在佇列中）則回傳 False"""
+        task = {'url': url, 'depth': depth, 'parent_url': parent_url, 'title': title, 'priority': priority}
+        keys = [self._key(name) for name in ('seen', 'tasks', 'priorities', 'queue', 'pending')]
+        return bool(self._push(keys=keys, args=[url, json.dumps(task, ensure_ascii=False), priority]))
+
+    def pop(self, worker_id=None):
+        """領取優先度最高的任務（並收回逾時未完成的任務），沒有可領取的任務時回傳 None"""
+        now = time.time()
+        keys = [self._key(name) for name in ('queue', 'inflight', 'tasks', 'priorities')]
+        task = self._pop(keys=keys, args=[now, now - self.lease_seconds])
+        return json.loads(self._text(task)) if task else None
+
+    def _finish_task(self, url, record_json):
+        keys = [self._key(name) for name in ('inflight', 'queue', 'done', 'pending', 'records')]
+        self._finish(keys=keys, args=[url, record_json])
+
+    def complete(self, url, record):
+        """回報任務完成並儲存頁面紀錄"""
+        self._finish_task(url, json.dumps(record, ensure_ascii=False))
+
+    def fail(self, url):
+        self._finish_task(url, '')
+
+    def is_finished(self):
+        """佇列為空且沒有進行中的任務"""
+        return int(self._text(self.client.get(self._key('pending'))) or 0) <= 0
+
+    def records(self, batch_size=500):
+        """逐筆產生頁面紀錄（HSCAN），避免一次載入所有紀錄"""
+        for _, value in self.client.hscan_iter(self._key('records'), count=batch_size):
+            yield json.loads(self._text(value))
+
+    def close(self):
+        pass
+
+
+def open_frontier(spec):
+    """依設定字串開啟共享佇列：sqlite:///path/to/file.db 或 redis://host:port/db"""
+    if spec.startswith('sqlite:///'):
+        return SQLiteFrontier(spec[len('sqlite:///'):])
+    if spec.startswith('redis://') or spec.startswith('rediss://'):
+        import redis
+        return RedisFrontier(redis.Redis.from_url(spec))
+    raise ValueError(f"不支援的 frontier 設定: {spec}")
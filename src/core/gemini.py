@@ -5,16 +5,109 @@ $ pip install google.ai.generativelanguage
 """
 
 import os
-import google.generativeai as genai
-from google.ai.generativelanguage_v1beta.types import content
-from dotenv import load_dotenv
+import re
+import json
+import threading
+import core.boilerplate as boilerplate
 
-# 載入環境變數
-load_dotenv()
+# Gemini SDK 載入較慢，第一次呼叫時才匯入並設定 API 金鑰
+_genai = None
+_genai_lock = threading.Lock()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+def get_genai():
+    """取得已設定好 API 金鑰的 google.generativeai 模組"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            from dotenv import load_dotenv
+            
+            # 載入環境變數
+            load_dotenv()
+            
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _genai = genai
+    return _genai
+
+class RelatedLinkStream:
+    """逐段解析串流中的 JSON，每當 related_links 陣列裡的一個連結物件完整時立即回傳"""
+
+    def __init__(self, key="related_links"):
+        self.key = f'"{key}"'
+        self.buffer = ""
+        self.pos = None  # 目前掃描到的位置；None 表示尚未找到陣列開頭
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start = None
+        self.done = False
+
+    def feed(self, text):
+        """加入新的片段，回傳此次完成的連結物件列表"""
+        self.buffer += text
+        links = []
+        if self.done:
+            return links
+        if self.pos is None:
+            key_index = self.buffer.find(self.key)
+            if key_index < 0:
+                return links
+            bracket = self.buffer.find("[", key_index + len(self.key))
+            if bracket < 0:
+                return links
+            self.pos = bracket + 1
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.start is not None:
+                    try:
+                        links.append(json.loads(self.buffer[self.start:self.pos + 1]))
+                    except ValueError:
+                        pass
+                    self.start = None
+            elif char == "]" and self.depth == 0:
+                self.done = True
+                self.pos += 1
+                break
+            self.pos += 1
+        return links
+
+def fix_link_url(link, web_content, page_url=None):
+    """將相對連結補為完整網址：有頁面網址時以它解析，否則只處理以 / 開頭的路徑（網域取自頁面內容開頭出現的網址）"""
+    if "url" in link and link["url"] and not (link["url"].startswith("http://") or link["url"].startswith("https://")):
+        if page_url:
+            link["url"] = boilerplate.resolve_url(link["url"], page_url)
+        # 嘗試修復相對URL
+        elif link["url"].startswith("/"):
+            # 從原始URL提取域名
+            domain_match = re.search(r'(https?://[^/]+)', web_content[:1000])
+            if domain_match:
+                link["url"] = domain_match.group(1) + link["url"]
+    return link
 
-def gemini_response(user_query, web_content):
+def gemini_response(user_query, web_content, budget=None, on_link=None, page_url=None):
+    """呼叫 Gemini 分析網頁內容
+    
+    傳入 on_link 時以串流模式讀取回應，related_links 中的每個連結一完成就呼叫 on_link(link)，
+    讓呼叫端在模型仍在產生回應時就開始爬取子頁面；
+    傳入 page_url 時內容中的相對網址以它解析，回應中的網址代號都會換回完整網址
+    """
+    genai = get_genai()
+    
     # Create the model
     generation_config = {
         "temperature": 0.1,  # 進一步降低溫度以提高精確性
@@ -93,8 +186,8 @@ JSON 格式必須為：
 }
 
 記住：所有卡片資訊都必須在 cards 陣列中，不要在外面新增卡片屬性。請只列出當前可申辦的信用卡，不要包含已停止申辦的卡片。
-對於圖片URL，請注意從網頁內容中找到img標籤的src屬性，確保提取完整的URL。
-對於卡片連結，請優先提取卡片詳情頁面的URL，確保使用完整的網址。"""
+網頁內容中的網址已換成短代號（例如 URL12），圖片與卡片連結請直接填入對應的代號，不要自行組合或改寫網址。
+對於卡片連結，請優先使用卡片詳情頁面的網址代號。"""
 }]
             }]
         )
@@ -139,7 +232,7 @@ JSON 格式必須為：
     ]
 }
 
-請務必關注網頁內容中的圖片和連結資訊，提取正確的卡片圖片URL和詳情頁面連結。確保提供的URL是完整的網址，可直接訪問。
+請務必關注網頁內容中的圖片和連結資訊，提取正確的卡片圖片和詳情頁面連結，網址請直接使用內容中的短代號。
 對於相同卡片出現在不同網站的情況，建議保留為不同的卡片記錄，以保留每個來源網站的特定連結和圖片資訊。"""}]
             }]
         )
@@ -174,21 +267,21 @@ JSON 格式必須為：
     {
       "cardName": "卡片名稱（盡可能提取完整精確的名稱）",
       "description": "卡片簡介（如有）",
-      "imageUrl": "卡片圖片的URL"
+      "imageUrl": "卡片圖片的網址代號"
     }
   ],
   "related_links": [
     {
       "title": "連結的精確描述或標題（優先使用卡片名稱）",
-      "url": "完整的URL路徑（包含http/https前綴）",
+      "url": "連結的網址代號（例如 URL12）",
       "description": "連結對應卡片的簡短描述或特點",
-      "imageUrl": "該卡片的圖片URL（如果在連結附近找到相關圖片）",
+      "imageUrl": "該卡片圖片的網址代號（如果在連結附近找到相關圖片）",
       "relevance": "高/中/低（評估此連結與查詢卡片的相關性）"
     }
   ]
 }
 
-請務必檢查URL是否完整，如果發現相對路徑，請嘗試推斷出完整URL。對於相關度高的卡片連結，給予更多細節描述。圖片URL也應該是完整的，如果是相對路徑，請嘗試使用與頁面相同的基本URL進行轉換。"""
+網址請直接使用內容中的短代號，程式會換回完整網址，不需要自行補全或推斷。對於相關度高的卡片連結，給予更多細節描述。"""
 }]
             }]
         )
@@ -204,7 +297,7 @@ JSON格式範例：
 "related_links": [
 {
 "title": "相關連結標題",
-"url": "相關連結網址",
+"url": "相關連結的網址代號（例如 URL12）",
 "description": "連結內容簡短描述"
 }
 ]
@@ -225,21 +318,45 @@ JSON格式範例：
 
 {user_query}"""
 
+    # 將網址換成短代號以減少 prompt token，回應中的代號再換回原本的網址
+    compact_content, url_map = boilerplate.compact_urls(web_content, base_url=page_url)
+
     prompt = f"""
 使用者需求：
 {enhanced_query}
 
+網頁內容中的網址以短代號（例如 URL12）表示，回傳網址時請直接使用相同的代號。
+
 網頁內容：
-{web_content}
+{compact_content}
 """
 
-    response = chat_session.send_message(prompt)
+    if on_link is None:
+        response = chat_session.send_message(prompt)
+        raw_text = response.text
+    else:
+        response = chat_session.send_message(prompt, stream=True)
+        link_stream = RelatedLinkStream()
+        chunks = []
+        for chunk in response:
+            chunks.append(chunk.text)
+            for link in link_stream.feed(chunk.text):
+                if isinstance(link, dict) and isinstance(link.get("url"), str):
+                    link["url"] = boilerplate.expand_urls(link["url"], url_map)
+                    if link.get("imageUrl"):
+                        link["imageUrl"] = boilerplate.expand_urls(str(link["imageUrl"]), url_map)
+                    on_link(fix_link_url(link, web_content, page_url))
+        raw_text = "".join(chunks)
+    response_text = boilerplate.expand_urls(raw_text, url_map, json_escape=True)
+    
+    # 記錄 token 用量到爬取預算
+    usage = getattr(response, "usage_metadata", None)
+    if budget is not None and usage is not None:
+        budget.add_tokens(usage.prompt_token_count, usage.candidates_token_count)
     
     # 嘗試優化 JSON 回應格式（如果是信用卡查詢）
     if is_credit_card_query and "請根據以上內容" not in user_query:
         try:
-            import json
-            response_text = response.text
             # 嘗試解析 JSON
             response_json = json.loads(response_text)
             
@@ -256,20 +373,13 @@ JSON格式範例：
                 
                 # 確保所有URL都是完整的
                 for link in response_json["related_links"]:
-                    if "url" in link and link["url"] and not (link["url"].startswith("http://") or link["url"].startswith("https://")):
-                        # 嘗試修復相對URL
-                        if link["url"].startswith("/"):
-                            # 從原始URL提取域名
-                            import re
-                            domain_match = re.search(r'(https?://[^/]+)', web_content[:1000])
-                            if domain_match:
-                                link["url"] = domain_match.group(1) + link["url"]
+                    fix_link_url(link, web_content, page_url)
             
             # 轉回JSON字符串
             return json.dumps(response_json, ensure_ascii=False)
         except Exception as e:
             # 如果解析失敗，返回原始回應
             print(f"JSON 優化處理失敗: {e}")
-            return response.text
+            return response_text
     
-    return response.text
\ No newline at end of file
+    return response_text
\ No newline at end of file
@@ -0,0 +1,146 @@
+import concurrent.futures
+import json
+import os
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from core.cards import URL_FIELDS
+
+# 連結檢查結果快取，避免每次執行都重新檢查相同的網址
+CACHE_PATH = os.path.join('data', 'link_cache.json')
+CACHE_TTL = 24 * 60 * 60
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
+}
+
+
+def _load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"無法讀取連結快取 {CACHE_PATH}: {e}")
+        return {}
+    now = time.time()
+    return {url: entry for url, entry in cache.items() if now - entry.get('checked_at', 0) < CACHE_TTL}
+
+
+def _save_cache(cache):
+    directory = os.path.dirname(CACHE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_PATH)
+
+
+def _check_one(session, url, timeout):
+    """先送 HEAD；伺服器不支援 HEAD 時改用只取第一個位元組的 GET"""
+    try:
+        response = session.head(url, headers=HEADERS, timeout=timeout, allow_redirects=True)
+        status = response.status_code
+        if status in (403, 405, 501) or status >= 500:
+            response = session.get(url, headers=dict(HEADERS, Range="bytes=0-0"),
+                                   timeout=timeout, allow_redirects=True, stream=True)
+            status = response.status_code
+            response.close()
+        return {'ok': status < 400, 'status': status}
+    except Exception as e:
+        return {'ok': False, 'status': None, 'error': type(e).__name__}
+
+
+def check_urls(urls, max_workers=32, per_host=4, timeout=10):
+    """並行檢查網址是否可連線，回傳 {url: {'ok', 'status'}}
+
+    共用連線池；每個網域各自排隊，只在該網域有空位時才提交，
+    單一網域的大量網址不會佔滿執行緒池而讓其他網域等待。結果快取於 data/link_cache.json
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    cache = _load_cache()
+    results = {url: cache[url] for url in urls if url in cache}
+    pending = [url for url in dict.fromkeys(urls) if url not in results]
+    if not pending:
+        return results
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    queues = {}
+    for url in pending:
+        queues.setdefault(urlparse(url).netloc, deque()).append(url)
+    active = {host: 0 for host in queues}
+
+    print(f"正在檢查 {len(pending)} 個連結（快取命中 {len(results)} 個）...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while queues or running:
+            # 輪流從各網域提交，直到執行緒池滿載或所有網域都已達同時請求上限
+            submitted = True
+            while submitted and len(running) < max_workers:
+                submitted = False
+                for host in list(queues):
+                    if len(running) >= max_workers:
+                        break
+                    if active[host] >= per_host:
+                        continue
+                    url = queues[host].popleft()
+                    if not queues[host]:
+                        del queues[host]
+                    active[host] += 1
+                    running[executor.submit(_check_one, session, url, timeout)] = (url, host)
+                    submitted = True
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                url, host = running.pop(future)
+                active[host] -= 1
+                result = future.result()
+                results[url] = result
+                # 連線錯誤與 5xx 可能只是暫時性的，不寫入快取
+                if result['status'] is not None and result['status'] < 500:
+                    cache[url] = dict(result, checked_at=time.time())
+    session.close()
+
+    _save_cache(cache)
+    return results
+
+
+def validate_cards(cards_list, drop_dead=False, **check_options):
+    """批次檢查卡片的圖片與詳情連結
+
+    每張卡片加上 linkStatus（各欄位的 HTTP 狀態碼，無法連線時為 None）；
+    drop_dead 為 True 時清空失效的連結。
+    只檢查完整網址：sourceUrl 是分析區塊的起始頁面，不一定是卡片所在的頁面，
+    無法正確解析的相對網址維持原樣，不檢查也不清空
+    """
+    to_check = set()
+    for card in cards_list:
+        for field in URL_FIELDS:
+            value = card.get(field)
+            if isinstance(value, str) and value.startswith(('http://', 'https://')):
+                to_check.add(value)
+
+    results = check_urls(sorted(to_check), **check_options)
+
+    dead_count = 0
+    for card in cards_list:
+        for field in URL_FIELDS:
+            result = results.get(card.get(field))
+            if result is None:
+                continue
+            card.setdefault('linkStatus', {})[field] = result['status']
+            if not result['ok']:
+                dead_count += 1
+                if drop_dead:
+                    card[field] = ''
+    print(f"連結檢查完成，共 {len(to_check)} 個，失效 {dead_count} 個")
+    return cards_list
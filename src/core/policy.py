@@ -0,0 +1,79 @@
+import threading
+from core.cards import normalize_text
+
+# Gemini 回傳的連結相關性對應的權重
+RELEVANCE_WEIGHTS = {"高": 3.0, "中": 2.0, "低": 1.0}
+# 沒有相關性標籤時使用的權重
+DEFAULT_RELEVANCE_WEIGHT = 1.5
+# 起始頁面的優先度，高於任何連結分數，確保每個起始網站都會先被爬取
+SEED_PRIORITY = 1e9
+
+
+def keyword_score(link, priority_keywords):
+    """計算連結標題和 URL 中包含優先關鍵詞的數量"""
+    text = (link.get("title", "") + link.get("url", "")).lower()
+    return sum(1 for keyword in priority_keywords if keyword in text)
+
+
+def link_priority(link, depth, priority_keywords, branch_yield=None):
+    """計算連結在全域佇列中的優先度，數值越大越先爬取
+
+    綜合 Gemini 的相關性標籤、優先關鍵詞、深度，以及父分支的產出率（每頁新發現的卡片數）
+    """
+    score = RELEVANCE_WEIGHTS.get(link.get("relevance"), DEFAULT_RELEVANCE_WEIGHT)
+    score += 0.5 * min(keyword_score(link, priority_keywords), 3)
+    score -= depth
+    if branch_yield is not None:
+        score += 4.0 * branch_yield
+    return score
+
+
+def card_key(card_name):
+    """正規化卡片名稱，用於判斷是否為新發現的卡片"""
+    return normalize_text(card_name)
+
+
+class YieldTracker:
+    """記錄每個分支（某頁面以下的子樹）已爬取的頁數與新發現的卡片數"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parents = {}
+        self._stats = {}
+        self._seen_cards = set()
+
+    def register(self, url, parent_url):
+        """在頁面排入佇列時記錄父頁面，讓比父頁面先完成的子頁面也能累加到祖先分支"""
+        with self._lock:
+            self._parents[url] = parent_url
+
+    def add_page(self, url, parent_url, page_result):
+        """記錄一個已爬取的頁面，並將頁數與新卡片數累加到所有祖先分支，回傳新卡片數"""
+        cards = (page_result or {}).get("creditCards", []) or []
+        with self._lock:
+            new_cards = 0
+            for card in cards:
+                name = card.get("cardName") if isinstance(card, dict) else None
+                if name and card_key(name) not in self._seen_cards:
+                    self._seen_cards.add(card_key(name))
+                    new_cards += 1
+            self._parents[url] = parent_url
+            node = url
+            while node is not None:
+                stats = self._stats.setdefault(node, [0, 0])
+                stats[0] += 1
+                stats[1] += new_cards
+                node = self._parents.get(node)
+        return new_cards
+
+    def branch_yield(self, url):
+        """分支的產出率（平滑後的每頁新卡片數）"""
+        with self._lock:
+            pages, cards = self._stats.get(url, [0, 0])
+        return (cards + 0.5) / (pages + 1)
+
+    def should_prune(self, url, min_yield, min_pages):
+        """分支已有足夠樣本且產出率低於門檻時，不再擴展"""
+        with self._lock:
+            pages, cards = self._stats.get(url, [0, 0])
+        return pages >= max(min_pages, 1) and cards / pages < min_yield
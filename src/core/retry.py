@@ -0,0 +1,162 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class RetryPolicy:
+    """指數退避加隨機抖動的重試策略"""
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0, jitter=0.5):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """第 attempt 次（從 0 起算）失敗後應等待的秒數"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay * (1 - self.jitter), delay)
+
+
+class CircuitBreaker:
+    """以網域為單位的斷路器：近期錯誤率過高時暫停該網域，冷卻後只放行一個試探請求"""
+
+    def __init__(self, window=10, min_requests=4, failure_threshold=0.5, cooldown=300):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._outcomes = {}
+        self._open_until = {}
+        self._probing = set()
+
+    def allow(self, host):
+        """此網域目前是否可以發出請求"""
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return True
+            if time.time() < open_until or host in self._probing:
+                return False
+            # 冷卻結束，進入半開狀態，只放行一個試探請求
+            self._probing.add(host)
+            return True
+
+    def record(self, host, success):
+        """記錄請求結果，斷路器因此打開時回傳 True"""
+        with self._lock:
+            outcomes = self._outcomes.setdefault(host, deque(maxlen=self.window))
+            if host in self._probing:
+                self._probing.discard(host)
+                if success:
+                    self._open_until.pop(host, None)
+                    outcomes.clear()
+                else:
+                    self._open_until[host] = time.time() + self.cooldown
+                    return True
+            outcomes.append(success)
+            if host in self._open_until or len(outcomes) < self.min_requests:
+                return False
+            failures = outcomes.count(False)
+            if failures / len(outcomes) >= self.failure_threshold:
+                self._open_until[host] = time.time() + self.cooldown
+                return True
+            return False
+
+    def trip(self, host, until):
+        """直接打開斷路器到指定時間（例如沿用上一次執行留下的紀錄）"""
+        with self._lock:
+            self._open_until[host] = until
+
+    def is_open(self, host):
+        """斷路器目前是否打開（冷卻中）"""
+        with self._lock:
+            return time.time() < self._open_until.get(host, 0)
+
+    def open_until(self, host):
+        with self._lock:
+            return self._open_until.get(host)
+
+
+class FailureLog:
+    """持久化的失敗紀錄（URL 與網域），到期後自動失效，讓下一次執行也能略過已知失敗的目標"""
+
+    def __init__(self, path=os.path.join('data', 'failed_urls.json'), ttl=6 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._urls = {}
+        self._hosts = {}
+        self._removed_hosts = set()
+        self._loaded = False
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"無法讀取失敗紀錄 {self.path}: {e}")
+            return {}, {}
+        now = time.time()
+        urls = {url: expires for url, expires in data.get('urls', {}).items() if expires > now}
+        hosts = {host: expires for host, expires in data.get('hosts', {}).items() if expires > now}
+        return urls, hosts
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._urls, self._hosts = self._read_file()
+            self._loaded = True
+
+    def is_failed(self, url):
+        with self._lock:
+            self._ensure_loaded()
+            expires = self._urls.get(url)
+            return expires is not None and expires > time.time()
+
+    def host_blocked_until(self, host):
+        """網域被封鎖到何時，未封鎖時回傳 None"""
+        with self._lock:
+            self._ensure_loaded()
+            expires = self._hosts.get(host)
+            return expires if expires is not None and expires > time.time() else None
+
+    def add_url(self, url):
+        with self._lock:
+            self._ensure_loaded()
+            self._urls[url] = time.time() + self.ttl
+
+    def add_host(self, host, until):
+        with self._lock:
+            self._ensure_loaded()
+            self._hosts[host] = until
+            self._removed_hosts.discard(host)
+
+    def remove_host(self, host):
+        with self._lock:
+            self._ensure_loaded()
+            self._hosts.pop(host, None)
+            self._removed_hosts.add(host)
+
+    def save(self):
+        """與檔案中既有的紀錄合併後寫回（其他 worker 可能同時寫入）"""
+        with self._lock:
+            if not self._loaded:
+                return
+            urls, hosts = self._read_file()
+            urls.update(self._urls)
+            hosts.update(self._hosts)
+            for host in self._removed_hosts:
+                hosts.pop(host, None)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'urls': urls, 'hosts': hosts}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
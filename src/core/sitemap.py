@@ -0,0 +1,145 @@
+import gzip
+import io
+import re
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse, unquote
+
+# 預設的信用卡頁面路徑樣式
+DEFAULT_PATH_PATTERNS = [r"credit[-_]?card", r"/cards?/", r"/card[-_]", r"信用卡"]
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
+    "Accept": "application/xml,text/xml,application/rss+xml,*/*;q=0.8",
+}
+
+
+def _local_name(tag):
+    """去除 XML 命名空間"""
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _is_sitemap_loc(tag):
+    """排除 image:loc、video:loc 等擴充標籤，只保留 sitemap 本身的 <loc>"""
+    if not tag.startswith('{'):
+        return True
+    return tag[1:].split('}', 1)[0].rstrip('/').endswith('/sitemap/0.9')
+
+
+def _open_stream(url, timeout=20):
+    """以串流方式開啟 XML，gzip 內容自動解壓縮；失敗時回傳 None"""
+    import requests
+    
+    try:
+        response = requests.get(url, headers=HEADERS, timeout=timeout, stream=True)
+    except Exception as e:
+        print(f"無法取得 {url}: {e}")
+        return None
+    if response.status_code != 200:
+        response.close()
+        return None
+    response.raw.decode_content = True
+    stream = io.BufferedReader(response.raw)
+    # 依內容判斷是否為 gzip：伺服器以 Content-Encoding: gzip 傳送的 .gz 檔已被解壓縮
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def iter_entries(url):
+    """串流解析 sitemap、sitemap index、RSS 或 Atom，逐一產生 (類型, URL)
+
+    類型為 'sitemap'（子 sitemap）或 'page'（頁面）；解析後即清除元素，記憶體用量不隨檔案大小成長
+    """
+    stream = _open_stream(url)
+    if stream is None:
+        return
+    root_name = None
+    try:
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            name = _local_name(elem.tag)
+            if event == 'start':
+                if root_name is None:
+                    root_name = name
+                continue
+            if name == 'loc' and elem.text and _is_sitemap_loc(elem.tag):
+                yield ('sitemap' if root_name == 'sitemapindex' else 'page'), elem.text.strip()
+            elif name == 'link' and root_name in ('rss', 'rdf', 'feed'):
+                # RSS 的 <link>文字</link> 與 Atom 的 <link href="..."/>
+                link = (elem.text or elem.get('href') or '').strip()
+                if link:
+                    yield 'page', link
+            if name in ('url', 'sitemap', 'item', 'entry'):
+                elem.clear()
+    except Exception as e:
+        # 格式錯誤、壞掉的壓縮檔或讀取中斷都只略過這個 sitemap，已產生的項目仍然有效
+        print(f"解析 {url} 失敗: {e}")
+    finally:
+        stream.close()
+
+
+def find_sitemaps(base_url):
+    """從 robots.txt 與預設位置找出網站的 sitemap"""
+    import requests
+    
+    parsed = urlparse(base_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    sitemaps = []
+    try:
+        response = requests.get(f"{origin}/robots.txt", headers=HEADERS, timeout=10)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                if line.lower().startswith('sitemap:'):
+                    sitemaps.append(urljoin(origin, line.split(':', 1)[1].strip()))
+    except Exception as e:
+        print(f"無法取得 robots.txt: {e}")
+    if not sitemaps:
+        sitemaps.append(f"{origin}/sitemap.xml")
+    return sitemaps
+
+
+def matches(url, path_patterns, priority_keywords):
+    """URL 路徑是否符合路徑樣式或包含優先關鍵詞（不比對網域，避免 card.example.com 之類的網域全部命中）"""
+    parsed = urlparse(url)
+    text = unquote(f"{parsed.path}?{parsed.query}").lower()
+    if any(re.search(pattern, text) for pattern in path_patterns):
+        return True
+    return any(keyword.lower() in text for keyword in priority_keywords)
+
+
+def discover_urls(base_url, priority_keywords=None, path_patterns=None, feed_urls=None, max_urls=200, max_sitemaps=20):
+    """在爬取前從 sitemap（及選用的 RSS）找出同網域的卡片頁面，不需要瀏覽器或 LLM"""
+    if priority_keywords is None:
+        priority_keywords = []
+    if path_patterns is None:
+        path_patterns = DEFAULT_PATH_PATTERNS
+
+    host = urlparse(base_url).netloc
+    pending = find_sitemaps(base_url) + list(feed_urls or [])
+    fetched = set()
+    found = []
+    seen = {base_url}
+
+    while pending and len(fetched) < max_sitemaps and len(found) < max_urls:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in fetched:
+            continue
+        fetched.add(sitemap_url)
+        print(f"正在解析 sitemap: {sitemap_url}")
+        for kind, url in iter_entries(sitemap_url):
+            if kind == 'sitemap':
+                # 子 sitemap 名稱本身符合條件的優先解析
+                if matches(url, path_patterns, priority_keywords):
+                    pending.insert(0, url)
+                else:
+                    pending.append(url)
+                continue
+            if url in seen or urlparse(url).netloc != host:
+                continue
+            seen.add(url)
+            if matches(url, path_patterns, priority_keywords):
+                found.append(url)
+                if len(found) >= max_urls:
+                    break
+
+    print(f"從 sitemap 找到 {len(found)} 個候選頁面: {base_url}")
+    return found
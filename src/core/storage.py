@@ -0,0 +1,160 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 頁面內容存放目錄（以內容雜湊定址，相同內容只存一份）
+PAGES_DIR = os.path.join('data', 'pages')
+# 清單檔格式標記
+MANIFEST_FORMAT = 'deepcrawl-manifest'
+MANIFEST_VERSION = 1
+
+# 記憶體中頁面內容的快取上限（以字元數估算位元組），超過時淘汰最久未使用的頁面
+_max_memory_bytes = 64 * 1024 * 1024
+_memory_cache = OrderedDict()
+_memory_bytes = 0
+_cache_lock = threading.Lock()
+
+
+class PageRef:
+    """頁面內容的延遲載入參照，只有在轉為字串時才從磁碟讀取"""
+    __slots__ = ('content_hash',)
+
+    def __init__(self, content_hash):
+        self.content_hash = content_hash
+
+    def __str__(self):
+        return get_page(self.content_hash)
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    def __eq__(self, other):
+        return isinstance(other, PageRef) and other.content_hash == self.content_hash
+
+    def __hash__(self):
+        return hash(self.content_hash)
+
+    def __repr__(self):
+        return f"PageRef({self.content_hash[:12]})"
+
+
+def content_hash(content):
+    """計算頁面內容的雜湊值"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def set_memory_limit(max_bytes):
+    """設定記憶體中頁面快取的上限（位元組），0 表示不快取"""
+    global _max_memory_bytes
+    with _cache_lock:
+        _max_memory_bytes = max_bytes
+        _evict()
+
+
+def _evict():
+    global _memory_bytes
+    while _memory_cache and _memory_bytes > _max_memory_bytes:
+        _, evicted = _memory_cache.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+def _remember(page_hash, content):
+    """將頁面內容放入記憶體快取"""
+    global _memory_bytes
+    size = len(content)
+    with _cache_lock:
+        if page_hash in _memory_cache:
+            _memory_cache.move_to_end(page_hash)
+            return
+        if size > _max_memory_bytes:
+            return
+        _memory_cache[page_hash] = content
+        _memory_bytes += size
+        _evict()
+
+
+def _page_path(page_hash):
+    return os.path.join(PAGES_DIR, page_hash[:2], f"{page_hash}.md.gz")
+
+
+def put_page(content):
+    """儲存頁面內容（已存在則略過），回傳 PageRef"""
+    if isinstance(content, PageRef):
+        return content
+    page_hash = content_hash(content)
+    path = _page_path(page_hash)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先寫入暫存檔再改名，避免並行寫入時讀到不完整的檔案
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    _remember(page_hash, content)
+    return PageRef(page_hash)
+
+
+def get_page(page_hash):
+    """依雜湊值讀取頁面內容，優先使用記憶體快取"""
+    with _cache_lock:
+        if page_hash in _memory_cache:
+            _memory_cache.move_to_end(page_hash)
+            return _memory_cache[page_hash]
+    with gzip.open(_page_path(page_hash), 'rt', encoding='utf-8') as f:
+        content = f.read()
+    _remember(page_hash, content)
+    return content
+
+
+def _dehydrate(node):
+    """將結果樹中的頁面內容換成雜湊參照"""
+    if isinstance(node, list):
+        return [_dehydrate(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    out = {}
+    for key, value in node.items():
+        if key == 'content' and isinstance(value, (str, PageRef)):
+            out['content_hash'] = put_page(value).content_hash
+        else:
+            out[key] = _dehydrate(value)
+    return out
+
+
+def _hydrate(node):
+    """將清單中的雜湊參照換回延遲載入的頁面內容"""
+    if isinstance(node, list):
+        return [_hydrate(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    out = {}
+    for key, value in node.items():
+        if key == 'content_hash':
+            out['content'] = PageRef(value)
+        else:
+            out[key] = _hydrate(value)
+    return out
+
+
+def save_manifest(result, filename):
+    """儲存爬蟲結果清單，頁面內容只以雜湊值參照"""
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'version': MANIFEST_VERSION,
+        'result': _dehydrate(result),
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return filename
+
+
+def is_manifest(data):
+    return isinstance(data, dict) and data.get('format') == MANIFEST_FORMAT
+
+
+def load_manifest(data):
+    """從已解析的清單資料還原結果樹，頁面內容延遲載入"""
+    return _hydrate(data['result'])
@@ -1,17 +1,109 @@
 import core.gemini as gemini
 import core.crawler as crawler
-from bs4 import BeautifulSoup
+import core.storage as storage
+import core.frontier as frontier
+from core.budget import CrawlBudget
+import core.policy as policy
+import core.sitemap as sitemap
+import core.cards as cards
+import core.boilerplate as boilerplate
+import core.api_capture as api_capture
+import core.linkcheck as linkcheck
 import json
 import os
+import re
 import atexit
 import concurrent.futures
+import heapq
+import itertools
+import multiprocessing
+import socket
+import threading
 import time
 from datetime import datetime
 
 # 註冊程式結束時的清理函數
 atexit.register(crawler.cleanup)
 
-def crawl_with_depth(user_query, base_url, max_depth=2, current_depth=0, visited_urls=None, max_links_per_page=None, priority_keywords=None):
+def rank_links(related_links, priority_keywords):
+    """依相關性或優先關鍵詞排序連結"""
+    # 如果有相關性評分的連結優先處理
+    if related_links and "relevance" in related_links[0]:
+        # 連結已經在 gemini.py 中排序了，這裡不需要再排序
+        print(f"收到 {len(related_links)} 個按相關性排序的連結")
+        return related_links
+    
+    # 用於舊版本的回應格式或沒有相關性評分的情況
+    # 根據優先關鍵詞給連結評分
+    for link in related_links:
+        # 計算連結標題和URL中包含優先關鍵詞的數量
+        link["priority_score"] = policy.keyword_score(link, priority_keywords)
+    
+    # 按評分排序連結
+    related_links = sorted(related_links, key=lambda x: x.get("priority_score", 0), reverse=True)
+    print(f"找到 {len(related_links)} 個連結並按優先順序排序")
+    return related_links
+
+def analyze_page(user_query, url, max_links_per_page=None, priority_keywords=None, budget=None, on_link=None):
+    """爬取單一頁面並由 Gemini 找出相關連結
+    
+    回傳 (content, page_result, related_links)；頁面無法爬取時 content 為 None，
+    Gemini 回應無法解析或 token 預算已用盡時 page_result 為 None。
+    傳入 on_link 時以串流模式呼叫 Gemini，每解析出一個連結就立即呼叫 on_link(link)，
+    回傳的 related_links 仍包含所有連結（呼叫端需自行略過已處理的連結）
+    """
+    if priority_keywords is None:
+        priority_keywords = ["信用卡", "卡片", "優惠", "card", "credit"]
+    
+    # 已記錄卡片資料 API 的頁面直接以 HTTP 取得結構化資料，不需要瀏覽器與 Gemini
+    replayed = api_capture.replay(url)
+    if replayed is not None:
+        markdown, credit_cards, related_links = replayed
+        page_result = {'creditCards': credit_cards, 'related_links': related_links}
+        related_links = rank_links(related_links, priority_keywords)
+        if max_links_per_page is not None:
+            related_links = related_links[:max_links_per_page]
+        return storage.put_page(markdown), page_result, related_links
+    
+    # 獲取當前頁面的內容
+    content = crawler.url_to_markdown(url, use_selenium=True)
+    if content is None:
+        return None, None, []
+    
+    # 節點只保存頁面內容的參照，需要時（combine_content）才從磁碟載入
+    page_ref = storage.put_page(content)
+    
+    # 預算用盡時保留頁面內容，但不再呼叫 Gemini 擴展連結
+    if budget is not None and budget.exhausted():
+        print(f"{budget.exhausted()}預算已用盡，不再分析連結: {url}")
+        return page_ref, None, []
+    
+    # 使用 Gemini 分析內容並取得相關連結（去除各頁面重複的樣板內容）
+    response = gemini.gemini_response(user_query, boilerplate.strip(url, content), budget=budget, on_link=on_link, page_url=url)
+    content = page_ref
+    
+    try:
+        # 解析 Gemini 回傳的 JSON
+        page_result = json.loads(response)
+    except json.JSONDecodeError:
+        print(f"JSON 解析錯誤: {response}")
+        return content, None, []
+    
+    related_links = rank_links(page_result.get('related_links', []), priority_keywords)
+    
+    # 限制每頁最多爬取的連結數量（如果設定了限制）
+    if max_links_per_page is not None and len(related_links) > max_links_per_page:
+        print(f"連結數量過多，限制為 {max_links_per_page} 個")
+        related_links = related_links[:max_links_per_page]
+    
+    return content, page_result, related_links
+
+def crawl_with_depth(user_query, base_url, max_depth=2, current_depth=0, visited_urls=None, max_links_per_page=None, priority_keywords=None, budget=None, seed_links=None, stream_links=False):
+    """逐層遞迴爬取
+    
+    stream_links 為 True 時，Gemini 回應中的每個連結一解析完成就開始爬取該子頁面，
+    子頁面的爬取與父頁面剩餘的回應生成重疊進行
+    """
     if visited_urls is None:
         visited_urls = set()
     
@@ -22,111 +114,292 @@ def crawl_with_depth(user_query, base_url, max_depth=2, current_depth=0, visited
         return None
     
     visited_urls.add(base_url)
-    print(f"正在爬取第 {current_depth + 1} 層: {base_url}")
     
-    # 獲取當前頁面的內容
-    content = crawler.url_to_markdown(base_url, use_selenium=True)
-    if content is None:
+    # 超出爬取預算時停止，已取得的結果仍會保留
+    if budget is not None and not budget.try_acquire_page(base_url):
+        print(f"已達爬取預算上限，略過: {base_url}")
         return None
     
-    # 使用 Gemini 分析內容並取得相關連結
-    response = gemini.gemini_response(user_query, content)
+    print(f"正在爬取第 {current_depth + 1} 層: {base_url}")
+    
+    # 已是最後一層時不需要爬取子頁面
+    can_expand = current_depth < max_depth - 1
+    sub_pages = []
     
-    try:
-        # 解析 Gemini 回傳的 JSON
-        result = json.loads(response)
-        related_links = result.get('related_links', [])
+    # 建立線程池（串流模式下在 Gemini 回應期間就會提交子頁面）
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        future_to_link = {}
+        submitted = set()
+        submit_lock = threading.Lock()
         
-        # 如果有相關性評分的連結優先處理
-        if related_links and "relevance" in related_links[0]:
-            # 連結已經在 gemini.py 中排序了，這裡不需要再排序
-            print(f"收到 {len(related_links)} 個按相關性排序的連結")
-        else:
-            # 用於舊版本的回應格式或沒有相關性評分的情況
-            # 根據優先關鍵詞給連結評分
-            for link in related_links:
-                # 計算連結標題和URL中包含優先關鍵詞的數量
-                score = sum(1 for keyword in priority_keywords if keyword in (link.get("title", "").lower() + link.get("url", "").lower()))
-                link["priority_score"] = score
-            
-            # 按評分排序連結
-            related_links = sorted(related_links, key=lambda x: x.get("priority_score", 0), reverse=True)
-            print(f"找到 {len(related_links)} 個連結並按優先順序排序")
+        def submit(link, limited=True):
+            url = link.get('url')
+            with submit_lock:
+                # 先過濾無效連結與已造訪的連結
+                if not url or not url.startswith('http') or url in visited_urls or url in submitted:
+                    return
+                # 串流的連結依到達順序計入每頁連結數量上限（sitemap 連結不受限制）
+                if limited and max_links_per_page is not None and len(submitted) >= max_links_per_page:
+                    return
+                submitted.add(url)
+                future = executor.submit(
+                    crawl_with_depth, 
+                    user_query, 
+                    url, 
+                    max_depth, 
+                    current_depth + 1, 
+                    visited_urls,
+                    max_links_per_page,
+                    priority_keywords,
+                    budget,
+                    None,
+                    stream_links
+                )
+                future_to_link[future] = link
         
-        # 限制每頁最多爬取的連結數量（如果設定了限制）
-        if max_links_per_page is not None and len(related_links) > max_links_per_page:
-            print(f"連結數量過多，限制為 {max_links_per_page} 個")
-            related_links = related_links[:max_links_per_page]
+        content, page_result, related_links = analyze_page(
+            user_query, base_url, max_links_per_page, priority_keywords, budget,
+            on_link=submit if stream_links and can_expand else None
+        )
+        if content is None:
+            if not seed_links:
+                return None
+            # 起始頁面無法爬取時仍爬取 sitemap 找到的頁面，根節點內容留空
+            print(f"起始頁面無法爬取，仍爬取 {len(seed_links)} 個 sitemap 連結: {base_url}")
+            content = ''
         
-        # 如果是最後一層，就不需要再爬取子頁面
-        if current_depth == max_depth - 1:
-            return {
-                'url': base_url,
-                'content': content,
-                'sub_pages': []
-            }
+        # 已是最後一層就不需要再爬取子頁面；串流模式下已提交的連結會被略過
+        if can_expand:
+            for link in related_links:
+                submit(link)
+            # 加入 sitemap 預先找到的連結（只在起始頁面傳入）
+            for link in seed_links or []:
+                submit(link, limited=False)
         
-        # 準備子頁面爬取
-        sub_pages = []
-        valid_links = []
+        # 獲取結果
+        with submit_lock:
+            futures = dict(future_to_link)
+        for future in concurrent.futures.as_completed(futures):
+            link = futures[future]
+            try:
+                sub_content = future.result()
+                if sub_content:
+                    sub_pages.append({
+                        'url': link.get('url'),
+                        'title': link.get('title', ''),
+                        'content': sub_content
+                    })
+            except Exception as exc:
+                print(f'爬取 {link.get("url")} 時發生錯誤: {exc}')
+    
+    return {
+        'url': base_url,
+        'content': content,
+        'sub_pages': sub_pages
+    }
+
+def crawl_best_first(user_query, base_urls, max_depth=2, max_links_per_page=None, priority_keywords=None, budget=None, max_workers=5, min_yield=0.2, min_branch_pages=3, seed_links=None, stream_links=False):
+    """以全域優先佇列進行最佳優先爬取，回傳 {起始 URL: 結果樹}
+    
+    連結優先度綜合相關性、優先關鍵詞、深度與父分支的產出率（每頁新發現的卡片數）；
+    分支爬取 min_branch_pages 頁後產出率仍低於 min_yield 時，不再擴展該分支。
+    seed_links 為 {起始 URL: 連結列表}，一開始就以起始 URL 為父頁面排入佇列，不受起始頁面能否爬取影響。
+    stream_links 為 True 時，Gemini 回應中的連結一解析完成就排入佇列，不必等待整份回應
+    """
+    if seed_links is None:
+        seed_links = {}
+    if priority_keywords is None:
+        priority_keywords = ["信用卡", "卡片", "優惠", "card", "credit"]
+    
+    tracker = policy.YieldTracker()
+    visited_urls = set(base_urls)
+    nodes = {}
+    # 父頁面尚未完成時先完成的子頁面，待父節點建立後再掛上
+    orphans = {}
+    heap = []
+    sequence = itertools.count()
+    # 串流模式下 worker 執行緒也會排入連結，佇列、已造訪集合與每頁連結數需加鎖
+    heap_lock = threading.Lock()
+    links_per_page = {}
+    
+    root_tasks = [{'url': url, 'depth': 0, 'parent_url': None, 'title': ''} for url in base_urls]
+    for task in root_tasks:
+        heapq.heappush(heap, (-policy.SEED_PRIORITY, next(sequence), task))
+    
+    def is_pruned(parent_url):
+        # 起始頁面代表整個網站，不依產出率剪枝
+        if parent_url is None or parent_url in base_urls:
+            return False
+        return tracker.should_prune(parent_url, min_yield, min_branch_pages)
+    
+    def push_link(link, task, limited=True):
+        """將連結排入佇列，回傳是否成功排入（已造訪或超過每頁連結數量上限時略過）"""
+        url = link.get('url')
+        if not url or not url.startswith('http'):
+            return False
+        with heap_lock:
+            if url in visited_urls:
+                return False
+            if limited and max_links_per_page is not None and links_per_page.get(task['url'], 0) >= max_links_per_page:
+                return False
+            visited_urls.add(url)
+            links_per_page[task['url']] = links_per_page.get(task['url'], 0) + 1
+            tracker.register(url, task['url'])
+            priority = policy.link_priority(link, task['depth'] + 1, priority_keywords, tracker.branch_yield(task['url']))
+            heapq.heappush(heap, (-priority, next(sequence), {
+                'url': url,
+                'depth': task['depth'] + 1,
+                'parent_url': task['url'],
+                'title': link.get('title', '')
+            }))
+        return True
+    
+    def pop_task():
+        with heap_lock:
+            return heapq.heappop(heap)[2] if heap else None
+    
+    def link_callback(task):
+        """串流模式下 Gemini 每解析出一個連結就排入佇列"""
+        if not stream_links or task['depth'] + 1 >= max_depth:
+            return None
         
-        # 先過濾有效連結
-        for link in related_links:
-            url = link.get('url')
-            if url and url.startswith('http') and url not in visited_urls:
-                valid_links.append(link)
+        def on_link(link):
+            if is_pruned(task['url']) or (budget is not None and budget.exhausted()):
+                return
+            push_link(link, task)
         
-        # 使用並行處理爬取子頁面
-        if valid_links:
-            # 建立線程池
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                # 提交爬取任務
-                future_to_link = {
-                    executor.submit(
-                        crawl_with_depth, 
-                        user_query, 
-                        link.get('url'), 
-                        max_depth, 
-                        current_depth + 1, 
-                        visited_urls,
-                        max_links_per_page,
-                        priority_keywords
-                    ): link for link in valid_links
-                }
+        return on_link
+    
+    # sitemap 連結直接以起始 URL 為父頁面排入佇列
+    if max_depth > 1:
+        for task in root_tasks:
+            for link in seed_links.get(task['url'], []):
+                push_link(link, task, limited=False)
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while True:
+            # 依優先度提交任務，直到執行緒池滿載
+            while len(running) < max_workers:
+                task = pop_task()
+                if task is None:
+                    break
+                if is_pruned(task['parent_url']):
+                    print(f"分支產出率過低，略過: {task['url']}")
+                    continue
+                if budget is not None and not budget.try_acquire_page(task['url']):
+                    if budget.exhausted():
+                        # 全域預算用盡，清空佇列，等待進行中的頁面完成後結束
+                        with heap_lock:
+                            print(f"{budget.exhausted()}預算已用盡，停止擴展 {len(heap) + 1} 個待爬取連結")
+                            heap.clear()
+                    else:
+                        print(f"已達該網域的頁數上限，略過: {task['url']}")
+                    continue
+                print(f"正在爬取第 {task['depth'] + 1} 層: {task['url']}")
+                future = executor.submit(analyze_page, user_query, task['url'], max_links_per_page, priority_keywords, budget, link_callback(task))
+                running[future] = task
+            
+            # 只有執行中的頁面會產生新連結，沒有執行中的頁面時佇列必定已清空
+            if not running:
+                break
+            
+            # 串流模式下執行緒池未滿時定期醒來，提交執行中頁面剛排入的連結
+            timeout = 0.2 if stream_links and len(running) < max_workers else None
+            done, _ = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    content, page_result, related_links = future.result()
+                except Exception as exc:
+                    print(f'爬取 {task["url"]} 時發生錯誤: {exc}')
+                    # 串流期間已排入的子頁面仍會被爬取，以內容留空的節點保留它們的結果
+                    with heap_lock:
+                        streamed = links_per_page.get(task['url'], 0)
+                    if not streamed:
+                        continue
+                    content, page_result, related_links = '', None, []
+                if content is None:
+                    continue
                 
-                # 獲取結果
-                for future in concurrent.futures.as_completed(future_to_link):
-                    link = future_to_link[future]
-                    try:
-                        sub_content = future.result()
-                        if sub_content:
-                            sub_pages.append({
-                                'url': link.get('url'),
-                                'title': link.get('title', ''),
-                                'content': sub_content
-                            })
-                    except Exception as exc:
-                        print(f'爬取 {link.get("url")} 時發生錯誤: {exc}')
-        
-        return {
-            'url': base_url,
-            'content': content,
-            'sub_pages': sub_pages
-        }
+                node = {'url': task['url'], 'content': content, 'sub_pages': orphans.pop(task['url'], [])}
+                nodes[task['url']] = node
+                if task['parent_url'] is not None:
+                    sub_page = {
+                        'url': task['url'],
+                        'title': task['title'],
+                        'content': node
+                    }
+                    if task['parent_url'] in nodes:
+                        nodes[task['parent_url']]['sub_pages'].append(sub_page)
+                    else:
+                        orphans.setdefault(task['parent_url'], []).append(sub_page)
+                
+                new_cards = tracker.add_page(task['url'], task['parent_url'], page_result)
+                if new_cards:
+                    print(f"發現 {new_cards} 張新卡片: {task['url']}")
+                
+                if task['depth'] + 1 >= max_depth or is_pruned(task['url']):
+                    continue
+                
+                # 串流模式下已排入的連結會被略過
+                for link in related_links:
+                    push_link(link, task)
     
-    except json.JSONDecodeError:
-        print(f"JSON 解析錯誤: {response}")
-        return {
-            'url': base_url,
-            'content': content,
-            'sub_pages': []
+    # 起始頁面無法爬取但 sitemap 頁面有結果時，建立內容留空的根節點
+    for url in base_urls:
+        if url not in nodes and url in orphans:
+            nodes[url] = {'url': url, 'content': '', 'sub_pages': orphans.pop(url)}
+    
+    return {url: nodes[url] for url in base_urls if url in nodes}
+
+def discover_seed_links(base_urls, priority_keywords=None, feed_urls=None):
+    """從各起始網站的 sitemap（及 feed_urls 中指定的 RSS/Atom）找出卡片頁面，回傳 {起始 URL: 連結列表}
+    
+    feed_urls 為 {起始 URL: [feed URL, ...]}
+    """
+    if feed_urls is None:
+        feed_urls = {}
+    seed_links = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(base_urls)) as executor:
+        future_to_url = {
+            executor.submit(sitemap.discover_urls, url, priority_keywords, feed_urls=feed_urls.get(url)): url for url in base_urls
         }
+        for future in concurrent.futures.as_completed(future_to_url):
+            url = future_to_url[future]
+            try:
+                seed_links[url] = [
+                    {'url': found_url, 'title': '', 'relevance': '中'}
+                    for found_url in future.result()
+                ]
+            except Exception as exc:
+                print(f'解析 {url} 的 sitemap 時發生錯誤: {exc}')
+    return seed_links
 
-def crawl_multiple_urls(user_query, base_urls, max_depth=2, max_links_per_page=None, priority_keywords=None):
-    """爬取多個起始 URL 並將結果合併"""
+def crawl_multiple_urls(user_query, base_urls, max_depth=2, max_links_per_page=None, priority_keywords=None, budget=None, strategy='depth', use_sitemaps=False, stream_links=False, feed_urls=None):
+    """爬取多個起始 URL 並將結果合併
+    
+    strategy 為 'depth' 時逐層遞迴爬取，'best_first' 時使用全域優先佇列並剪除低產出分支；
+    use_sitemaps 為 True 時先從 sitemap（及 feed_urls 指定的 RSS/Atom）找出卡片頁面直接排入佇列；
+    stream_links 為 True 時以串流讀取 Gemini 回應，連結一解析完成就開始爬取
+    """
     all_results = []
     visited_urls = set()
     saved_files = []
+    seed_links = discover_seed_links(base_urls, priority_keywords, feed_urls) if use_sitemaps else {}
+    
+    if strategy == 'best_first':
+        results_by_url = crawl_best_first(
+            user_query,
+            base_urls,
+            max_depth=max_depth,
+            max_links_per_page=max_links_per_page,
+            priority_keywords=priority_keywords,
+            budget=budget,
+            seed_links=seed_links,
+            stream_links=stream_links
+        )
+        return save_results(results_by_url)
     
     # 並行爬取起始 URL
     with concurrent.futures.ThreadPoolExecutor(max_workers=len(base_urls)) as executor:
@@ -140,7 +413,10 @@ def crawl_multiple_urls(user_query, base_urls, max_depth=2, max_links_per_page=N
                 0, 
                 visited_urls,
                 max_links_per_page,
-                priority_keywords
+                priority_keywords,
+                budget,
+                seed_links.get(url),
+                stream_links
             ): url for url in base_urls
         }
         
@@ -152,25 +428,218 @@ def crawl_multiple_urls(user_query, base_urls, max_depth=2, max_links_per_page=N
                 result = future.result()
                 if result:
                     # 每個 URL 爬取完成後立即儲存結果
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f'data/crawl_result_{url.replace("://", "_").replace("/", "_").replace(".", "_")}_{timestamp}.json'
-                    saved_file = save_crawl_result(result, filename)
-                    saved_files.append(saved_file)
-                    print(f"URL {url} 爬蟲結果已儲存至: {saved_file}")
+                    saved_files.append(save_url_result(url, result))
                     all_results.append(result)
             except Exception as exc:
                 print(f'爬取 {url} 時發生錯誤: {exc}')
     
     # 儲存所有結果的合併版本
     if all_results:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        combined_filename = f'data/crawl_result_combined_{timestamp}.json'
-        save_crawl_result(all_results, combined_filename)
-        saved_files.append(combined_filename)
-        print(f"所有爬蟲結果合併版本已儲存至: {combined_filename}")
+        saved_files.append(save_combined_results(all_results))
+    
+    return all_results, saved_files
+
+def save_url_result(url, result):
+    """儲存單一起始 URL 的爬蟲結果"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'data/crawl_result_{url.replace("://", "_").replace("/", "_").replace(".", "_")}_{timestamp}.json'
+    saved_file = save_crawl_result(result, filename)
+    print(f"URL {url} 爬蟲結果已儲存至: {saved_file}")
+    return saved_file
+
+def save_combined_results(all_results):
+    """儲存所有結果的合併版本"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    combined_filename = f'data/crawl_result_combined_{timestamp}.json'
+    save_crawl_result(all_results, combined_filename)
+    print(f"所有爬蟲結果合併版本已儲存至: {combined_filename}")
+    return combined_filename
+
+def save_results(results_by_url):
+    """儲存每個起始 URL 的結果與合併版本，回傳 (all_results, saved_files)"""
+    all_results = []
+    saved_files = []
+    for url, result in results_by_url.items():
+        saved_files.append(save_url_result(url, result))
+        all_results.append(result)
+    
+    if all_results:
+        saved_files.append(save_combined_results(all_results))
     
     return all_results, saved_files
 
+def run_worker(frontier_spec, worker_id=None, poll_interval=2):
+    """分散式爬取的 worker：從共享佇列領取 URL，爬取後把頁面紀錄與新連結送回佇列
+    
+    同一個 frontier_spec 可在多個程序或多台機器上同時執行
+    """
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = frontier.open_frontier(frontier_spec)
+    config = work_queue.get_config()
+    max_depth = config.get('max_depth', 2)
+    # 預算計數器存放在共享佇列中，所有 worker 共用同一份預算
+    budget = CrawlBudget.from_config(config.get('budget'), counters=work_queue)
+    # 與協調者共用同一個 data/pages 時只回傳內容雜湊值，否則回傳完整內容
+    shared_pages = (config.get('pages_host') == socket.gethostname()
+                    and config.get('pages_dir') == os.path.abspath(storage.PAGES_DIR))
+    print(f"Worker {worker_id} 已啟動")
+    
+    try:
+        while True:
+            task = work_queue.pop(worker_id)
+            if task is None:
+                if work_queue.is_finished():
+                    break
+                # 其他 worker 仍在爬取，稍後可能會產生新的連結
+                time.sleep(poll_interval)
+                continue
+            
+            url = task['url']
+            # 預算用盡後仍持續取出任務並標記為略過，讓佇列能清空、協調者得以結束
+            if budget is not None and not budget.try_acquire_page(url):
+                work_queue.fail(url)
+                continue
+            
+            print(f"[{worker_id}] 正在爬取第 {task['depth'] + 1} 層: {url}")
+            
+            pushed = set()
+            
+            def push_link(link, task=task, pushed=pushed):
+                link_url = link.get('url')
+                max_links = config.get('max_links_per_page')
+                if not link_url or not link_url.startswith('http') or link_url in pushed:
+                    return
+                if max_links is not None and len(pushed) >= max_links:
+                    return
+                pushed.add(link_url)
+                priority = policy.link_priority(link, task['depth'] + 1, config.get('priority_keywords') or [])
+                work_queue.push(link_url, task['depth'] + 1, parent_url=task['url'], title=link.get('title', ''), priority=priority)
+            
+            # 串流模式下連結一解析完成就推入共享佇列，其他 worker 可以立即開始爬取
+            stream = config.get('stream_links') and task['depth'] + 1 < max_depth
+            try:
+                content, page_result, related_links = analyze_page(
+                    config['user_query'],
+                    url,
+                    config.get('max_links_per_page'),
+                    config.get('priority_keywords'),
+                    budget,
+                    on_link=push_link if stream else None
+                )
+            except Exception as exc:
+                print(f'爬取 {url} 時發生錯誤: {exc}')
+                work_queue.fail(url)
+                continue
+            
+            if content is None:
+                work_queue.fail(url)
+                continue
+            
+            # 先推入子連結再回報完成，避免佇列在中途被誤判為已清空（已推入的連結會被佇列略過）
+            if task['depth'] + 1 < max_depth:
+                for link in related_links:
+                    push_link(link)
+            
+            record = {
+                'url': url,
+                'parent_url': task['parent_url'],
+                'title': task['title'],
+                'depth': task['depth']
+            }
+            if shared_pages:
+                record['content_hash'] = content.content_hash
+            else:
+                record['content'] = str(content)
+            work_queue.complete(url, record)
+    finally:
+        # worker 程序不會執行 atexit，直接清理並寫回失敗紀錄
+        crawler.cleanup()
+        work_queue.close()
+    print(f"Worker {worker_id} 已結束")
+
+def build_result_tree(records, base_urls):
+    """將 worker 回傳的頁面紀錄組回與 crawl_with_depth 相同的樹狀結構
+    
+    records 可以是逐筆產生紀錄的迭代器；每筆紀錄讀取後立即轉為頁面參照，不會同時保留所有頁面內容
+    """
+    contents = {}
+    children = {}
+    for record in records:
+        if record.get('content_hash'):
+            contents[record['url']] = storage.PageRef(record['content_hash'])
+        else:
+            contents[record['url']] = storage.put_page(record.get('content', ''))
+        if record.get('parent_url'):
+            children.setdefault(record['parent_url'], []).append((record['url'], record.get('title', '')))
+    
+    def build_node(url):
+        # 起始頁面無法爬取時 records 中沒有它的紀錄，但 sitemap 頁面仍以它為父頁面
+        return {
+            'url': url,
+            'content': contents.get(url, ''),
+            'sub_pages': [
+                {
+                    'url': child_url,
+                    'title': title,
+                    'content': build_node(child_url)
+                }
+                for child_url, title in children.get(url, [])
+            ]
+        }
+    
+    return {url: build_node(url) for url in base_urls if url in contents or url in children}
+
+def crawl_distributed(user_query, base_urls, frontier_spec='sqlite:///data/frontier.db', num_workers=4, max_depth=2, max_links_per_page=None, priority_keywords=None, budget=None, use_sitemaps=False, stream_links=False, feed_urls=None):
+    """以共享佇列進行分散式爬取，並在本機啟動 num_workers 個 worker 程序
+    
+    其他機器可用相同的 frontier_spec 執行 worker.py 加入爬取
+    """
+    work_queue = frontier.open_frontier(frontier_spec)
+    work_queue.reset()
+    work_queue.set_config({
+        'user_query': user_query,
+        'max_depth': max_depth,
+        'max_links_per_page': max_links_per_page,
+        'priority_keywords': priority_keywords,
+        'budget': budget.to_config() if budget is not None else None,
+        'stream_links': stream_links,
+        # 同一台機器上使用相同頁面目錄的 worker 只回傳內容雜湊值
+        'pages_host': socket.gethostname(),
+        'pages_dir': os.path.abspath(storage.PAGES_DIR)
+    })
+    for url in base_urls:
+        work_queue.push(url, 0, priority=policy.SEED_PRIORITY)
+    
+    # sitemap 找到的頁面直接以第二層排入共享佇列
+    if use_sitemaps and max_depth > 1:
+        for base_url, links in discover_seed_links(base_urls, priority_keywords, feed_urls).items():
+            for link in links:
+                priority = policy.link_priority(link, 1, priority_keywords or [])
+                work_queue.push(link['url'], 1, parent_url=base_url, priority=priority)
+    
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(frontier_spec, f"{socket.gethostname()}-local-{i}"))
+        for i in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    # 等待遠端 worker 完成剩餘的任務
+    while not work_queue.is_finished():
+        time.sleep(2)
+    
+    results_by_url = build_result_tree(work_queue.records(), base_urls)
+    # 將共享計數器的用量帶回本機的預算物件，方便呼叫端輸出摘要
+    if budget is not None:
+        for name in ('pages', 'input_tokens', 'output_tokens'):
+            budget.counters.incr(name, work_queue.get_counter(name))
+    work_queue.close()
+    
+    return save_results(results_by_url)
+
 def save_crawl_result(result, filename=None):
     # 創建 data 目錄（如果不存在）
     if not os.path.exists('data'):
@@ -181,16 +650,18 @@ def save_crawl_result(result, filename=None):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'data/crawl_result_{timestamp}.json'
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    
-    return filename
+    # 頁面內容以雜湊值存入 data/pages，清單檔只保留參照，避免重複儲存
+    return storage.save_manifest(result, filename)
 
 def load_crawl_result(filename):
     """載入爬蟲結果，並處理可能的格式差異"""
     with open(filename, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
+    # 新格式：頁面內容在讀取時才從 data/pages 載入
+    if storage.is_manifest(data):
+        data = storage.load_manifest(data)
+    
     # 檢查並適應不同的資料結構
     if isinstance(data, list) and len(data) == 1:
         # 有時資料可能被儲存為單元素列表
@@ -198,9 +669,15 @@ def load_crawl_result(filename):
     
     return data
 
-def combine_content(results):
-    """整合所有爬取結果的內容"""
+def page_text(url, content, seen_blocks):
+    """去除頁面的樣板區塊，並以頁面網址解析相對連結（整合多個頁面後無法再得知相對連結屬於哪個頁面）"""
+    return boilerplate.resolve_urls(boilerplate.strip(url, str(content), seen_blocks), url)
+
+def combine_content(results, seen_blocks=None):
+    """整合所有爬取結果的內容，各頁面重複的樣板區塊只保留第一次出現的那份"""
     combined_content = "所有頁面內容：\n"
+    if seen_blocks is None:
+        seen_blocks = set()
     
     # 檢查 results 的型別
     if isinstance(results, dict):
@@ -215,7 +692,8 @@ def combine_content(results):
         try:
             # 檢查 result 是否是字典且包含必要的鍵
             if isinstance(result, dict) and 'url' in result and 'content' in result:
-                combined_content += f"\n主頁面 ({result['url']})：\n{result['content']}\n"
+                main_content = page_text(result['url'], result['content'], seen_blocks)
+                combined_content += f"\n主頁面 ({result['url']})：\n{main_content}\n"
                 
                 # 處理子頁面
                 if 'sub_pages' in result and isinstance(result['sub_pages'], list):
@@ -223,13 +701,13 @@ def combine_content(results):
                         if isinstance(sub_page, dict) and 'title' in sub_page and 'url' in sub_page and 'content' in sub_page:
                             if isinstance(sub_page['content'], dict) and 'content' in sub_page['content']:
                                 # 如果子頁面的 content 是一個字典且包含 content 鍵
-                                sub_content = sub_page['content']['content']
+                                sub_content = page_text(sub_page['url'], sub_page['content']['content'], seen_blocks)
                             elif isinstance(sub_page['content'], dict) and 'url' in sub_page['content']:
                                 # 遞迴處理巢狀結構
-                                sub_content = combine_content([sub_page['content']])
+                                sub_content = combine_content([sub_page['content']], seen_blocks)
                             else:
                                 # 否則直接使用 content
-                                sub_content = sub_page['content']
+                                sub_content = page_text(sub_page['url'], sub_page['content'], seen_blocks)
                             
                             combined_content += f"\n子頁面：{sub_page['title']} ({sub_page['url']}):\n{sub_content}\n"
             elif isinstance(result, str):
@@ -247,6 +725,144 @@ def combine_content(results):
     
     return combined_content
 
+FINAL_ANALYSIS_QUERY = "請根據以上內容，條列出所有信用卡優惠，並以JSON格式輸出，必須包含卡名、發卡銀行、卡片類型、年費、回饋類型、卡片圖片URL、卡片詳情頁面連結、優惠內容（包括類別、詳細描述和回饋率）等資訊，要有良好的結構化"
+
+def parse_json_response(response_text):
+    """解析 Gemini 回傳的 JSON，失敗時嘗試修復常見的格式錯誤；仍無法解析時拋出例外"""
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        print(f"\n無法解析回傳的 JSON: {e}")
+        print("嘗試修復 JSON 格式並重新解析...")
+    
+    # 1. 移除可能的額外資訊
+    cleaned_json = response_text.strip()
+    
+    # 2. 嘗試找出 JSON 的起始和結束
+    if cleaned_json.find('{') >= 0 and cleaned_json.rfind('}') >= 0:
+        start = cleaned_json.find('{')
+        end = cleaned_json.rfind('}') + 1
+        cleaned_json = cleaned_json[start:end]
+    
+    # 3. 使用正則表達式嘗試修復常見格式錯誤
+    # 修復逗號後缺少空格
+    cleaned_json = re.sub(r',\s*"', ', "', cleaned_json)
+    # 修復多餘的逗號
+    cleaned_json = re.sub(r',\s*}', '}', cleaned_json)
+    # 嘗試修復嵌套在卡片內的卡片（根據原始 JSON 錯誤的特定模式）
+    cleaned_json = re.sub(r'"cardName":\s*"[^"]+",\s*"issuer":', '"issuer":', cleaned_json)
+    
+    # 手動修復特定問題
+    if '"cards": [' in cleaned_json and '], "cardName":' in cleaned_json:
+        parts = cleaned_json.split('], "cardName":')
+        if len(parts) > 1:
+            # 將第二張卡片信息添加到第一個 cards 陣列中
+            second_card = '{' + parts[1].strip()
+            # 確保陣列結構正確
+            first_part = parts[0] + ', ' + second_card
+            cleaned_json = first_part + ']}'
+    
+    # 4. 嘗試重新解析
+    return json.loads(cleaned_json)
+
+def save_raw_response(response_text):
+    """儲存無法解析的原始回應以便手動分析"""
+    if not os.path.exists('results'):
+        os.makedirs('results')
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    raw_filename = f'results/raw_response_{timestamp}.txt'
+    
+    with open(raw_filename, 'w', encoding='utf-8') as f:
+        f.write(response_text)
+    
+    print(f"原始回應已儲存至: {raw_filename}")
+    return raw_filename
+
+def split_result(result, max_chars=100_000):
+    """將單一來源的結果樹依子頁面切成多個區塊，讓每次最終分析的內容（與輸出的卡片數）不超過上限"""
+    if not isinstance(result, dict) or len(combine_content(result)) <= max_chars:
+        return [result]
+    
+    chunks = []
+    current = []
+    current_size = len(str(result.get('content', '')))
+    for sub_page in result.get('sub_pages', []):
+        size = len(combine_content({'url': result['url'], 'content': '', 'sub_pages': [sub_page]}))
+        if current and current_size + size > max_chars:
+            chunks.append(current)
+            current = []
+            current_size = 0
+        current.append(sub_page)
+        current_size += size
+    chunks.append(current)
+    
+    # 主頁面內容只放在第一個區塊
+    return [
+        {'url': result['url'], 'content': result.get('content', '') if i == 0 else '', 'sub_pages': sub_pages}
+        for i, sub_pages in enumerate(chunks)
+    ]
+
+def analyze_chunk(chunk):
+    """對一個來源區塊進行最終分析，回傳卡片清單"""
+    response_text = gemini.gemini_response(FINAL_ANALYSIS_QUERY, combine_content(chunk))
+    try:
+        json_result = parse_json_response(response_text)
+    except Exception as e:
+        print(f"修復 JSON 失敗: {e}")
+        save_raw_response(response_text)
+        return []
+    
+    cards_list = json_result.get('cards', []) if isinstance(json_result, dict) else []
+    # 記錄卡片資料的來源頁面
+    source_url = chunk.get('url') if isinstance(chunk, dict) else None
+    for card in cards_list:
+        if isinstance(card, dict) and source_url:
+            card.setdefault('sourceUrl', source_url)
+    return cards_list
+
+def iter_pages(node):
+    """逐一產生結果樹中所有頁面的 (url, content)"""
+    if isinstance(node, list):
+        for item in node:
+            yield from iter_pages(item)
+    elif isinstance(node, dict):
+        if 'url' in node and isinstance(node.get('content'), (str, storage.PageRef)):
+            yield node['url'], node['content']
+        for sub_page in node.get('sub_pages', []) or []:
+            if isinstance(sub_page, dict) and isinstance(sub_page.get('content'), dict):
+                yield from iter_pages(sub_page['content'])
+            elif isinstance(sub_page, dict) and 'url' in sub_page:
+                yield from iter_pages(sub_page)
+
+def analyze_results(results, max_workers=4, max_chars=100_000):
+    """以來源（銀行）或子樹為單位平行進行最終分析，再於本機合併卡片清單"""
+    if not isinstance(results, list):
+        results = [results]
+    
+    # 沿用既有爬蟲結果時，先從所有頁面學習樣板內容
+    for url, content in iter_pages(results):
+        boilerplate.observe(url, str(content))
+    
+    chunks = []
+    for result in results:
+        chunks.extend(split_result(result, max_chars))
+    print(f"最終分析共 {len(chunks)} 個區塊")
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(analyze_chunk, chunk) for chunk in chunks]
+        card_lists = []
+        # 依區塊順序收集結果，合併結果才不受完成順序影響
+        for chunk, future in zip(chunks, futures):
+            try:
+                card_lists.append(future.result())
+            except Exception as exc:
+                print(f"分析 {chunk.get('url') if isinstance(chunk, dict) else ''} 時發生錯誤: {exc}")
+    
+    merged = cards.merge_cards(card_lists)
+    print(f"合併後共 {len(merged)} 張卡片")
+    return {'cards': merged}
+
 def main():
     # 檢查是否有已存在的爬蟲結果
     latest_result_file = None
@@ -283,15 +899,59 @@ def main():
         # 爬取設定
         max_depth = 3  # 設定爬取深度
         max_links_per_page = None  # 限制每頁最多爬取的連結數量，提高效率和精確度
+        storage.set_memory_limit(64 * 1024 * 1024)  # 記憶體中頁面內容快取上限，其餘內容留在磁碟
+        # 分散式爬取的共享佇列，例如 "sqlite:///data/frontier.db" 或 "redis://localhost:6379/0"；None 表示單一程序爬取
+        frontier_spec = None
+        num_workers = 4  # 分散式爬取時在本機啟動的 worker 數量
+        crawl_strategy = 'best_first'  # 'best_first'：依優先度與分支產出率爬取；'depth'：逐層展開所有連結
+        use_sitemaps = True  # 爬取前先從 sitemap 找出卡片頁面，減少需要 Gemini 展開的層數
+        # 各起始網站額外解析的 RSS/Atom feed，例如 {"https://bank.example/cards": ["https://bank.example/news.rss"]}
+        feed_urls = {}
+        stream_links = True  # 串流讀取 Gemini 回應，連結一解析完成就開始爬取子頁面
+        # 記錄 JS 頁面載入卡片資料的 JSON API，之後直接重放（跳過 Selenium 與 Gemini）
+        api_capture.set_enabled(False)
         
-        results, saved_files = crawl_multiple_urls(
-            "條列出所有信用卡優惠和詳細連結", 
-            base_urls, 
-            max_depth=max_depth,
-            max_links_per_page=max_links_per_page,
-            priority_keywords=priority_keywords
+        # 爬取預算：任何一項用盡後停止擴展，仍以已取得的結果進行最終分析（None 表示不限制）
+        budget = CrawlBudget(
+            max_pages=200,  # 總頁數上限
+            max_pages_per_host=100,  # 每個網域的頁數上限
+            max_seconds=30 * 60,  # 爬取時間上限（秒）
+            max_input_tokens=2_000_000,  # Gemini 輸入 token 上限
+            max_output_tokens=400_000  # Gemini 輸出 token 上限
         )
         
+        if frontier_spec:
+            results, saved_files = crawl_distributed(
+                "條列出所有信用卡優惠和詳細連結",
+                base_urls,
+                frontier_spec=frontier_spec,
+                num_workers=num_workers,
+                max_depth=max_depth,
+                max_links_per_page=max_links_per_page,
+                priority_keywords=priority_keywords,
+                budget=budget,
+                use_sitemaps=use_sitemaps,
+                feed_urls=feed_urls,
+                stream_links=stream_links
+            )
+        else:
+            results, saved_files = crawl_multiple_urls(
+                "條列出所有信用卡優惠和詳細連結", 
+                base_urls, 
+                max_depth=max_depth,
+                max_links_per_page=max_links_per_page,
+                priority_keywords=priority_keywords,
+                budget=budget,
+                strategy=crawl_strategy,
+                use_sitemaps=use_sitemaps,
+                feed_urls=feed_urls,
+                stream_links=stream_links
+            )
+        
+        if budget.exhausted():
+            print(f"{budget.exhausted()}預算已用盡，以部分結果繼續分析")
+        print(budget.summary())
+        
         if not results:
             print("爬取失敗")
             return
@@ -299,109 +959,29 @@ def main():
         print(f"載入既有的爬蟲結果: {latest_result_file}")
         results = load_crawl_result(latest_result_file)
     
-    # 整合內容
-    combined_content = combine_content(results)
-    
-    # 最終分析
+    # 最終分析：每個來源各自分析後在本機合併
     print("正在進行最終分析...")
-    final_response = gemini.gemini_response(
-        "請根據以上內容，條列出所有信用卡優惠，並以JSON格式輸出，必須包含卡名、發卡銀行、卡片類型、年費、回饋類型、卡片圖片URL、卡片詳情頁面連結、優惠內容（包括類別、詳細描述和回饋率）等資訊，要有良好的結構化",
-        combined_content
-    )
+    json_result = analyze_results(results)
     
-    print("\n=== 分析結果 ===")
-    print(final_response)
+    # 檢查模型推測的圖片與卡片連結是否有效（drop_dead=True 會清空失效連結）
+    linkcheck.validate_cards(json_result['cards'], drop_dead=False)
     
-    # 解析並格式化 JSON 結果
-    try:
-        # 嘗試解析 Gemini 回傳的 JSON
-        json_result = json.loads(final_response)
-        
-        # 建立結果目錄（如果不存在）
-        if not os.path.exists('results'):
-            os.makedirs('results')
-        
-        # 儲存格式化的 JSON 結果
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        json_filename = f'results/analysis_result_{timestamp}.json'
-        
-        with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(json_result, f, ensure_ascii=False, indent=2)
-        
-        print(f"\n格式化的 JSON 結果已儲存至: {json_filename}")
-        
-        # 顯示格式化的 JSON
-        print("\n=== 格式化的 JSON 結果 ===")
-        print(json.dumps(json_result, ensure_ascii=False, indent=2))
-    except json.JSONDecodeError as e:
-        print(f"\n無法解析回傳的 JSON: {e}")
-        print("嘗試修復 JSON 格式並重新解析...")
-        
-        try:
-            # 嘗試修復 JSON
-            # 1. 移除可能的額外資訊
-            cleaned_json = final_response.strip()
-            
-            # 2. 嘗試找出 JSON 的起始和結束
-            if cleaned_json.find('{') >= 0 and cleaned_json.rfind('}') >= 0:
-                start = cleaned_json.find('{')
-                end = cleaned_json.rfind('}') + 1
-                cleaned_json = cleaned_json[start:end]
-            
-            # 3. 使用正則表達式嘗試修復常見格式錯誤
-            import re
-            # 修復逗號後缺少空格
-            cleaned_json = re.sub(r',\s*"', ', "', cleaned_json)
-            # 修復多餘的逗號
-            cleaned_json = re.sub(r',\s*}', '}', cleaned_json)
-            # 嘗試修復嵌套在卡片內的卡片（根據原始 JSON 錯誤的特定模式）
-            cleaned_json = re.sub(r'"cardName":\s*"[^"]+",\s*"issuer":', '"issuer":', cleaned_json)
-            
-            # 手動修復特定問題
-            if '"cards": [' in cleaned_json and '], "cardName":' in cleaned_json:
-                parts = cleaned_json.split('], "cardName":')
-                if len(parts) > 1:
-                    # 將第二張卡片信息添加到第一個 cards 陣列中
-                    second_card = '{' + parts[1].strip()
-                    # 確保陣列結構正確
-                    first_part = parts[0] + ', ' + second_card
-                    cleaned_json = first_part + ']}'
-            
-            # 4. 嘗試重新解析
-            json_result = json.loads(cleaned_json)
-            
-            # 建立結果目錄（如果不存在）
-            if not os.path.exists('results'):
-                os.makedirs('results')
-            
-            # 儲存修復後的 JSON
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            json_filename = f'results/analysis_result_fixed_{timestamp}.json'
-            
-            with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(json_result, f, ensure_ascii=False, indent=2)
-            
-            print(f"\n修復後的 JSON 結果已儲存至: {json_filename}")
-            
-            # 顯示格式化的 JSON
-            print("\n=== 修復後的 JSON 結果 ===")
-            print(json.dumps(json_result, ensure_ascii=False, indent=2))
-        except Exception as fix_error:
-            print(f"修復 JSON 失敗: {fix_error}")
-            
-            # 儲存原始回應以便手動分析
-            if not os.path.exists('results'):
-                os.makedirs('results')
-                
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            raw_filename = f'results/raw_response_{timestamp}.txt'
-            
-            with open(raw_filename, 'w', encoding='utf-8') as f:
-                f.write(final_response)
-            
-            print(f"原始回應已儲存至: {raw_filename}")
-            print("原始回應:")
-            print(final_response)
+    # 建立結果目錄（如果不存在）
+    if not os.path.exists('results'):
+        os.makedirs('results')
+    
+    # 儲存格式化的 JSON 結果
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    json_filename = f'results/analysis_result_{timestamp}.json'
+    
+    with open(json_filename, 'w', encoding='utf-8') as f:
+        json.dump(json_result, f, ensure_ascii=False, indent=2)
+    
+    print(f"\n格式化的 JSON 結果已儲存至: {json_filename}")
+    
+    # 顯示格式化的 JSON
+    print("\n=== 格式化的 JSON 結果 ===")
+    print(json.dumps(json_result, ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":
     try:
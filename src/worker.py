@@ -0,0 +1,14 @@
+"""
+分散式爬取 worker，可在多台機器上執行並連到同一個共享佇列
+
+$ python worker.py redis://coordinator-host:6379/0
+"""
+
+import sys
+import main
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python worker.py <frontier_spec> [worker_id]")
+        sys.exit(1)
+    main.run_worker(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 程式以 src/ 為工作目錄執行（import core.xxx），測試也從同一個位置匯入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
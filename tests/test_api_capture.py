@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import core.api_capture as api_capture
+
+PAGE = 'https://bank.example/cards/list.htm'
+API_RESPONSE = {
+    'status': 'ok',
+    'banners': [{'title': '活動', 'img': '/b.png'}],
+    'data': {
+        'items': [
+            {'cardName': 'JCB 晶緻卡', 'desc': '信用卡 3% 回饋', 'imgUrl': '/img/jcb.png', 'detailUrl': '/cards/jcb.htm'},
+            {'cardName': '鈦金卡', 'desc': '信用卡 國內 1%', 'imgUrl': 'https://cdn.example/ti.png', 'detailUrl': 'javascript:void(0)'},
+        ],
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def endpoints(monkeypatch, tmp_path):
+    monkeypatch.setattr(api_capture, 'ENDPOINTS_PATH', str(tmp_path / 'api_endpoints.json'))
+    monkeypatch.setattr(api_capture, '_endpoints', None)
+    monkeypatch.setattr(api_capture, '_enabled', True)
+
+
+def test_find_card_records_in_nested_json():
+    path, records = api_capture.find_card_records(API_RESPONSE)
+    assert path == ['data', 'items']
+    assert [record['cardName'] for record in records] == ['JCB 晶緻卡', '鈦金卡']
+    assert api_capture.find_card_records({'banners': API_RESPONSE['banners']}) == (None, [])
+
+
+def test_records_to_markdown():
+    markdown = api_capture.records_to_markdown(API_RESPONSE['data']['items'][:1])
+    assert markdown.splitlines()[:3] == ['### JCB 晶緻卡', '- cardName: JCB 晶緻卡', '- desc: 信用卡 3% 回饋']
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.data
+
+
+def _save_endpoint():
+    api_capture._load().setdefault('bank.example', {})[PAGE] = [
+        {'url': 'https://bank.example/api/cards', 'method': 'GET', 'body': None, 'content_type': None, 'path': ['data', 'items']}
+    ]
+    api_capture._save()
+
+
+def test_replay_returns_cards_and_links(monkeypatch):
+    requests = pytest.importorskip('requests')
+    _save_endpoint()
+    monkeypatch.setattr(requests, 'request', lambda method, url, **kwargs: FakeResponse(API_RESPONSE))
+    markdown, credit_cards, related_links = api_capture.replay(PAGE)
+    assert '### 鈦金卡' in markdown
+    assert credit_cards == [
+        {'cardName': 'JCB 晶緻卡', 'imageUrl': 'https://bank.example/img/jcb.png'},
+        {'cardName': '鈦金卡', 'imageUrl': 'https://cdn.example/ti.png'},
+    ]
+    # 圖片欄位不會被當成詳情連結，javascript: 連結不輸出
+    assert [(link['title'], link['url']) for link in related_links] == [('JCB 晶緻卡', 'https://bank.example/cards/jcb.htm')]
+
+
+def test_failed_replay_removes_endpoint(monkeypatch):
+    requests = pytest.importorskip('requests')
+    _save_endpoint()
+    monkeypatch.setattr(requests, 'request', lambda method, url, **kwargs: FakeResponse({}, status_code=500))
+    assert api_capture.replay(PAGE) is None
+    with open(api_capture.ENDPOINTS_PATH, encoding='utf-8') as f:
+        assert json.load(f) == {'bank.example': {}}
+    assert api_capture.replay(PAGE) is None
+
+
+def test_replay_disabled_or_unknown_page(monkeypatch):
+    assert api_capture.replay('https://bank.example/unknown') is None
+    monkeypatch.setattr(api_capture, '_enabled', False)
+    _save_endpoint()
+    assert api_capture.replay(PAGE) is None
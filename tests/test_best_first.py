@@ -0,0 +1,55 @@
+import pytest
+
+import main
+import core.storage as storage
+from core.budget import CrawlBudget
+
+SEEDS = [f'https://bank{i}.example/cards' for i in range(8)]
+
+
+@pytest.fixture(autouse=True)
+def work_dir(monkeypatch, tmp_path):
+    # 結果檔與頁面內容寫入暫存目錄
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, 'PAGES_DIR', str(tmp_path / 'data' / 'pages'))
+
+
+def fake_analyze_page(user_query, url, max_links_per_page=None, priority_keywords=None, budget=None, on_link=None):
+    """每個頁面都回傳許多高相關性的信用卡連結"""
+    links = [{'url': f'{url}/card{i}', 'title': '信用卡優惠', 'relevance': '高'} for i in range(10)]
+    for link in links:
+        if on_link is not None:
+            on_link(dict(link))
+    return storage.put_page(f'內容 {url}'), {'creditCards': [], 'related_links': links}, links
+
+
+@pytest.mark.parametrize('stream_links', [False, True])
+def test_every_seed_is_crawled_before_links(monkeypatch, stream_links):
+    monkeypatch.setattr(main, 'analyze_page', fake_analyze_page)
+    results = main.crawl_best_first('信用卡', SEEDS, max_depth=3, budget=CrawlBudget(max_pages=20),
+                                    max_workers=5, stream_links=stream_links)
+    assert sorted(results) == sorted(SEEDS)
+
+
+def test_distributed_crawl_starts_every_seed(monkeypatch):
+    monkeypatch.setattr(main, 'analyze_page', fake_analyze_page)
+    monkeypatch.setattr(main.crawler, 'cleanup', lambda: None)
+    results, _ = main.crawl_distributed('信用卡', SEEDS, frontier_spec='sqlite:///data/frontier.db', num_workers=1,
+                                        max_depth=3, budget=CrawlBudget(max_pages=12))
+    assert sorted(result['url'] for result in results) == sorted(SEEDS)
+
+
+def test_streamed_children_survive_parent_error(monkeypatch):
+    def analyze_page(user_query, url, max_links_per_page=None, priority_keywords=None, budget=None, on_link=None):
+        if url == 'https://bank.example/':
+            on_link({'url': 'https://bank.example/card', 'title': '卡片', 'relevance': '高'})
+            # 子連結已排入後 Gemini 串流才中斷
+            raise RuntimeError("串流中斷")
+        return storage.put_page(f'內容 {url}'), {'creditCards': []}, []
+
+    monkeypatch.setattr(main, 'analyze_page', analyze_page)
+    results = main.crawl_best_first('信用卡', ['https://bank.example/'], max_depth=2, stream_links=True)
+    root = results['https://bank.example/']
+    assert root['content'] == ''
+    assert [sub_page['url'] for sub_page in root['sub_pages']] == ['https://bank.example/card']
+    assert str(root['sub_pages'][0]['content']['content']) == '內容 https://bank.example/card'
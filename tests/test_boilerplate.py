@@ -0,0 +1,42 @@
+import core.boilerplate as boilerplate
+
+
+def test_javascript_links_keep_only_text():
+    text, mapping = boilerplate.compact_urls("[申請](javascript:void(0)) 與 [比較](javascript:compare('a', 1))")
+    assert text == "申請 與 比較"
+    assert mapping == {}
+
+
+def test_link_titles_are_compacted():
+    text, mapping = boilerplate.compact_urls('[卡片](https://bank.example/card.htm "卡片 A")')
+    assert text == '[卡片](URL1 "卡片 A")'
+    assert mapping == {'URL1': 'https://bank.example/card.htm'}
+
+
+def test_relative_urls_resolve_against_page():
+    text, mapping = boilerplate.compact_urls('![卡面](images/a.png) [詳情](../detail.htm?utm_source=x)',
+                                             base_url='https://bank.example/cards/list/index.htm')
+    assert mapping == {
+        'URL1': 'https://bank.example/cards/list/images/a.png',
+        'URL2': 'https://bank.example/cards/detail.htm',
+    }
+    assert boilerplate.expand_urls('{"imageUrl": "URL1"}', mapping, json_escape=True) == \
+        '{"imageUrl": "https://bank.example/cards/list/images/a.png"}'
+
+
+def test_resolve_urls_keeps_absolute_and_anchor_links():
+    markdown = '[a](/a) [b](https://other.example/b) [c](#top) [d](mailto:x@bank.example)'
+    assert boilerplate.resolve_urls(markdown, 'https://bank.example/cards/') == \
+        '[a](https://bank.example/a) [b](https://other.example/b) [c](#top) [d](mailto:x@bank.example)'
+
+
+def test_strip_tracking_params_keeps_other_urls_unchanged():
+    for url in ['https://bank.example/cards?Card%20Type=All,Bank%20Card',
+                'https://bank.example/a?flag',
+                'https://cdn.example/a.png?sig=a%2Bb%3D&exp=1']:
+        assert boilerplate.strip_tracking_params(url) == url
+
+
+def test_strip_tracking_params_removes_only_tracking_params():
+    url = 'https://bank.example/cards?Card%20Type=All,Bank%20Card&utm_source=fb&fbclid=x&flag'
+    assert boilerplate.strip_tracking_params(url) == 'https://bank.example/cards?Card%20Type=All,Bank%20Card&flag'
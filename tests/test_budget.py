@@ -0,0 +1,72 @@
+import time
+
+from core.budget import CrawlBudget
+from core.frontier import SQLiteFrontier
+
+
+def test_total_page_limit_rolls_back_counters():
+    budget = CrawlBudget(max_pages=2, max_pages_per_host=5)
+    assert budget.try_acquire_page('https://a.example/1')
+    assert budget.try_acquire_page('https://b.example/1')
+    assert budget.exhausted() == "頁數"
+    assert not budget.try_acquire_page('https://a.example/2')
+    # 失敗的預扣不應留在計數器中
+    assert budget.counters.get_counter('pages') == 2
+    assert budget.counters.get_counter('host:a.example') == 1
+
+
+def test_per_host_limit_rolls_back_counters():
+    budget = CrawlBudget(max_pages=10, max_pages_per_host=1)
+    assert budget.try_acquire_page('https://a.example/1')
+    assert not budget.try_acquire_page('https://a.example/2')
+    assert budget.counters.get_counter('host:a.example') == 1
+    assert budget.counters.get_counter('pages') == 1
+    # 其他網域不受影響，整體預算也未用盡
+    assert budget.try_acquire_page('https://b.example/1')
+    assert budget.exhausted() is None
+
+
+def test_unlimited_budget_still_counts_pages():
+    budget = CrawlBudget()
+    assert budget.try_acquire_page('https://a.example/1')
+    assert budget.counters.get_counter('pages') == 1
+    assert budget.exhausted() is None
+
+
+def test_deadline():
+    assert CrawlBudget(max_seconds=60).exhausted() is None
+    budget = CrawlBudget(deadline=time.time() - 1)
+    assert budget.exhausted() == "時間"
+    assert not budget.try_acquire_page('https://a.example/1')
+
+
+def test_token_exhaustion():
+    budget = CrawlBudget(max_input_tokens=100, max_output_tokens=50)
+    budget.add_tokens(60, 10)
+    assert budget.exhausted() is None
+    budget.add_tokens(None, 40)
+    assert budget.exhausted() == "輸出 token"
+    budget = CrawlBudget(max_input_tokens=100)
+    budget.add_tokens(100, 0)
+    assert budget.exhausted() == "輸入 token"
+
+
+def test_config_round_trip_through_frontier_counters(tmp_path):
+    coordinator_queue = SQLiteFrontier(str(tmp_path / 'frontier.db'))
+    worker_queue = SQLiteFrontier(str(tmp_path / 'frontier.db'))
+    budget = CrawlBudget(max_pages=2, max_pages_per_host=1, max_seconds=60, max_input_tokens=10)
+    coordinator_queue.set_config({'budget': budget.to_config()})
+
+    # 兩個 worker 依設定還原預算，共用佇列中的計數器
+    first = CrawlBudget.from_config(worker_queue.get_config()['budget'], counters=worker_queue)
+    second = CrawlBudget.from_config(coordinator_queue.get_config()['budget'], counters=coordinator_queue)
+    assert first.to_config() == budget.to_config()
+    assert first.try_acquire_page('https://a.example/1')
+    assert not second.try_acquire_page('https://a.example/2')
+    assert second.try_acquire_page('https://b.example/1')
+    assert first.exhausted() == second.exhausted() == "頁數"
+    first.add_tokens(10, 0)
+    assert coordinator_queue.get_counter('input_tokens') == 10
+    assert CrawlBudget.from_config(None) is None
+    coordinator_queue.close()
+    worker_queue.close()
@@ -0,0 +1,88 @@
+import itertools
+import random
+import time
+
+import main
+from core.cards import merge_cards, normalize_text
+
+SOURCE_A = [
+    {"cardName": "ＪＣＢ 晶緻卡", "issuer": "富邦銀行", "annualFee": "免年費",
+     "imageUrl": "/images/jcb.png", "benefits": [{"category": "餐飲", "rate": "3%"}]},
+    {"cardName": "鈦金卡", "issuer": "富邦銀行", "benefits": ["國內 1%"]},
+]
+SOURCE_B = [
+    {"cardName": "jcb晶緻卡", "issuer": "富邦 銀行", "annualFee": "首年免年費",
+     "imageUrl": "https://bank.example/images/jcb.png", "cardLink": "https://bank.example/jcb",
+     "benefits": [{"category": "餐飲", "rate": "3%"}, {"category": "網購", "rate": "5%"}]},
+]
+SOURCE_C = [
+    {"cardName": "JCB 晶緻卡！", "issuer": "富邦銀行", "annualFee": "免年費", "benefits": [{"category": " 餐飲", "rate": "3 %"}]},
+]
+
+
+def test_merge_does_not_depend_on_input_order():
+    results = [merge_cards(list(order)) for order in itertools.permutations([SOURCE_A, SOURCE_B, SOURCE_C])]
+    assert all(result == results[0] for result in results)
+
+
+def test_name_variants_merge_into_one_card():
+    merged = merge_cards([SOURCE_A, SOURCE_B, SOURCE_C])
+    assert len(merged) == 2
+    jcb = next(card for card in merged if "晶緻" in card["cardName"])
+    # 全形、大小寫、空白與標點不同的卡名視為同一張卡，出現較多次的年費勝出
+    assert jcb["annualFee"] == "免年費"
+    assert jcb["cardLink"] == "https://bank.example/jcb"
+
+
+def test_absolute_url_wins_over_relative():
+    merged = merge_cards([SOURCE_A, SOURCE_B])
+    jcb = next(card for card in merged if "晶緻" in card["cardName"])
+    assert jcb["imageUrl"] == "https://bank.example/images/jcb.png"
+
+
+def test_duplicate_benefits_are_removed():
+    merged = merge_cards([SOURCE_A, SOURCE_B, SOURCE_C])
+    jcb = next(card for card in merged if "晶緻" in card["cardName"])
+    # 只有空白差異的優惠視為重複，保留其中一份
+    assert len(jcb["benefits"]) == 2
+    assert sorted(normalize_text(benefit["category"]) for benefit in jcb["benefits"]) == ["網購", "餐飲"]
+
+
+def _big_result():
+    return {
+        'url': 'https://bank.example/',
+        'content': '首頁 ' * 100,
+        'sub_pages': [
+            {'url': f'https://bank.example/{i}', 'title': f'卡片 {i}',
+             'content': {'url': f'https://bank.example/{i}', 'content': f'內容 {i} ' * 200, 'sub_pages': []}}
+            for i in range(6)
+        ],
+    }
+
+
+def test_split_result_keeps_chunks_under_limit():
+    result = _big_result()
+    chunks = main.split_result(result, max_chars=3000)
+    assert len(chunks) > 1
+    assert [sub_page['url'] for chunk in chunks for sub_page in chunk['sub_pages']] == \
+        [sub_page['url'] for sub_page in result['sub_pages']]
+    # 主頁面內容只放在第一個區塊
+    assert chunks[0]['content'] == result['content']
+    assert all(chunk['content'] == '' for chunk in chunks[1:])
+    assert all(len(main.combine_content(chunk)) <= 3000 for chunk in chunks)
+
+
+def test_analyze_results_is_deterministic(monkeypatch):
+    monkeypatch.setattr(main.boilerplate, 'observe', lambda url, markdown: None)
+
+    def analyze_chunk(chunk):
+        # 以隨機延遲打亂各區塊完成的順序
+        time.sleep(random.uniform(0, 0.02))
+        first = chunk['sub_pages'][0]['url'] if chunk['sub_pages'] else chunk['url']
+        return [{"cardName": "JCB 晶緻卡", "issuer": "富邦", "benefits": [first]},
+                {"cardName": f"卡片 {first}", "issuer": "富邦"}]
+
+    monkeypatch.setattr(main, 'analyze_chunk', analyze_chunk)
+    outputs = [main.analyze_results([_big_result()], max_workers=4, max_chars=3000) for _ in range(5)]
+    assert all(output == outputs[0] for output in outputs)
+    assert len(outputs[0]['cards']) == len(main.split_result(_big_result(), 3000)) + 1
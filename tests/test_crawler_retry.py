@@ -0,0 +1,56 @@
+import pytest
+
+import core.crawler as crawler
+from core.retry import RetryPolicy, CircuitBreaker, FailureLog
+
+
+@pytest.fixture
+def fresh_crawler(monkeypatch, tmp_path):
+    """每個測試使用全新的斷路器、失敗紀錄與快取，重試不等待"""
+    monkeypatch.setattr(crawler, '_retry_policy', RetryPolicy(max_retries=3, base_delay=0))
+    monkeypatch.setattr(crawler, '_breaker', CircuitBreaker(min_requests=4))
+    monkeypatch.setattr(crawler, '_failure_log', FailureLog(path=str(tmp_path / 'failed_urls.json')))
+    monkeypatch.setattr(crawler, '_failed_urls', set())
+    monkeypatch.setattr(crawler, '_checked_hosts', set())
+    monkeypatch.setattr(crawler, '_page_cache', {})
+    return crawler
+
+
+def _fail_with_503(url):
+    raise crawler.RetryableFetchError("狀態碼 503")
+
+
+def test_retries_of_one_url_do_not_open_breaker(fresh_crawler, monkeypatch):
+    monkeypatch.setattr(fresh_crawler, '_fetch_with_scraper', _fail_with_503)
+    assert fresh_crawler.url_to_markdown('https://dead.example/a') is None
+    assert not fresh_crawler._breaker.is_open('dead.example')
+    assert fresh_crawler._failure_log.host_blocked_until('dead.example') is None
+
+
+def test_breaker_opens_after_distinct_urls_fail(fresh_crawler, monkeypatch):
+    monkeypatch.setattr(fresh_crawler, '_fetch_with_scraper', _fail_with_503)
+    for i in range(4):
+        fresh_crawler.url_to_markdown(f'https://dead.example/{i}')
+    assert fresh_crawler._breaker.is_open('dead.example')
+
+
+def test_failed_selenium_probe_releases_half_open_state(fresh_crawler, monkeypatch):
+    pytest.importorskip('selenium')
+
+    def raise_error(url):
+        raise ValueError("非瀏覽器錯誤")
+
+    # 模擬冷卻剛結束的網域：下一個請求是半開狀態的試探請求
+    fresh_crawler._breaker.trip('flaky.example', 0)
+    monkeypatch.setattr(fresh_crawler, '_fetch_with_selenium', raise_error)
+
+    assert fresh_crawler.url_to_markdown('https://flaky.example/a', use_selenium=True) is None
+    # 試探失敗後重新進入冷卻，而不是永久停在試探中
+    assert fresh_crawler._breaker.is_open('flaky.example')
+
+
+def test_failed_probe_reopens_breaker(fresh_crawler, monkeypatch):
+    fresh_crawler._breaker.trip('flaky.example', 0)
+    monkeypatch.setattr(fresh_crawler, '_fetch_with_scraper', _fail_with_503)
+    assert fresh_crawler.url_to_markdown('https://flaky.example/a') is None
+    assert fresh_crawler._breaker.is_open('flaky.example')
@@ -0,0 +1,25 @@
+import pytest
+
+import main
+import core.storage as storage
+
+
+@pytest.fixture(autouse=True)
+def pages_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'PAGES_DIR', str(tmp_path / 'pages'))
+
+
+def test_result_tree_from_record_stream():
+    # 共用 data/pages 的 worker 只回傳雜湊值，遠端 worker 回傳完整內容
+    root_ref = storage.put_page('起始頁面')
+    records = iter([
+        {'url': 'https://a.example/', 'parent_url': None, 'title': '', 'depth': 0, 'content_hash': root_ref.content_hash},
+        {'url': 'https://a.example/card', 'parent_url': 'https://a.example/', 'title': '卡片', 'depth': 1, 'content': '卡片頁面'},
+    ])
+    tree = main.build_result_tree(records, ['https://a.example/'])
+    root = tree['https://a.example/']
+    assert str(root['content']) == '起始頁面'
+    assert root['sub_pages'][0]['title'] == '卡片'
+    child = root['sub_pages'][0]['content']
+    assert isinstance(child['content'], storage.PageRef)
+    assert str(child['content']) == '卡片頁面'
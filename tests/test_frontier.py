@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from core.frontier import SQLiteFrontier, RedisFrontier
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def make_frontier(request, tmp_path):
+    """建立指定後端的共享佇列；Redis 以 fakeredis（需 Lua 支援）代替實際的伺服器"""
+    created = []
+
+    def make(lease_seconds=600):
+        if request.param == 'sqlite':
+            work_queue = SQLiteFrontier(str(tmp_path / 'frontier.db'), lease_seconds=lease_seconds)
+        else:
+            fakeredis = pytest.importorskip('fakeredis')
+            pytest.importorskip('lupa')
+            if not created:
+                make.server = fakeredis.FakeServer()
+            work_queue = RedisFrontier(fakeredis.FakeRedis(server=make.server), lease_seconds=lease_seconds)
+        created.append(work_queue)
+        return work_queue
+
+    yield make
+    for work_queue in created:
+        work_queue.close()
+
+
+def test_push_pop_complete(make_frontier):
+    work_queue = make_frontier()
+    work_queue.reset()
+    assert work_queue.is_finished()
+    assert work_queue.push('https://a.example/', 0)
+    assert not work_queue.push('https://a.example/', 0)
+    assert work_queue.push('https://a.example/high', 1, parent_url='https://a.example/', title='高', priority=5)
+    assert not work_queue.is_finished()
+
+    task = work_queue.pop('w1')
+    assert task['url'] == 'https://a.example/high'
+    assert task['parent_url'] == 'https://a.example/' and task['title'] == '高' and task['depth'] == 1
+    work_queue.complete(task['url'], {'url': task['url'], 'content_hash': 'abc'})
+
+    task = work_queue.pop('w1')
+    assert task['url'] == 'https://a.example/'
+    # 已領取但尚未完成的任務仍未結束
+    assert work_queue.pop('w2') is None
+    assert not work_queue.is_finished()
+    work_queue.fail(task['url'])
+
+    assert work_queue.is_finished()
+    assert [record['url'] for record in work_queue.records()] == ['https://a.example/high']
+
+
+def test_expired_lease_is_reclaimed(make_frontier):
+    work_queue = make_frontier(lease_seconds=0.05)
+    work_queue.reset()
+    work_queue.push('https://a.example/', 0)
+    assert work_queue.pop('w1')['url'] == 'https://a.example/'
+    assert work_queue.pop('w2') is None
+    time.sleep(0.1)
+    # 第一個 worker 逾時未回報，任務重新排入並由其他 worker 領取
+    assert work_queue.pop('w2')['url'] == 'https://a.example/'
+    work_queue.complete('https://a.example/', {'url': 'https://a.example/'})
+    assert work_queue.is_finished()
+    # 逾時的 worker 稍後才回報完成，不應影響計數
+    work_queue.complete('https://a.example/', {'url': 'https://a.example/'})
+    assert work_queue.is_finished()
+
+
+def test_workers_share_state(make_frontier):
+    coordinator = make_frontier()
+    coordinator.reset()
+    coordinator.set_config({'max_depth': 2})
+    coordinator.push('https://a.example/', 0)
+    worker = make_frontier()
+    assert worker.get_config() == {'max_depth': 2}
+    task = worker.pop('w1')
+    # worker 先推入子連結再回報完成，協調者在過程中不會誤判為已結束
+    worker.push('https://a.example/child', 1, parent_url=task['url'])
+    worker.complete(task['url'], {'url': task['url']})
+    assert not coordinator.is_finished()
+    assert worker.incr('pages') == 1 and coordinator.get_counter('pages') == 1
+
+
+def test_records_are_read_in_batches(make_frontier):
+    work_queue = make_frontier()
+    work_queue.reset()
+    urls = [f'https://a.example/{i}' for i in range(7)]
+    for url in urls:
+        work_queue.push(url, 0)
+        work_queue.complete(work_queue.pop('w1')['url'], {'url': url})
+    assert sorted(record['url'] for record in work_queue.records(batch_size=3)) == sorted(urls)
@@ -0,0 +1,46 @@
+import json
+import random
+
+import pytest
+
+from core.gemini import RelatedLinkStream
+
+LINKS = [
+    {"title": '卡片 "A" {限定}', "url": "URL1", "relevance": "高"},
+    {"title": "反斜線 \\ 與 ]", "url": "/cards/b", "extra": {"tags": ["a", {"b": "}"}], "n": 1}},
+    {"title": "C", "url": "https://bank.example/c"},
+]
+
+
+def feed_in_chunks(text, seed):
+    rng = random.Random(seed)
+    stream = RelatedLinkStream()
+    links = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        links.extend(stream.feed(text[position:position + size]))
+        position += size
+    return links
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_links_are_emitted_from_random_chunks(seed):
+    response = {
+        "creditCards": [{"cardName": "卡 {1}", "benefits": ["[回饋]", {"rate": "3%"}]}],
+        "related_links": LINKS,
+        "other": [{"url": "不應輸出"}],
+    }
+    # Gemini 常以 Markdown 程式碼區塊包住 JSON
+    text = "```json\n" + json.dumps(response, ensure_ascii=False, indent=2) + "\n```"
+    assert feed_in_chunks(text, seed) == LINKS
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_empty_related_links(seed):
+    text = json.dumps({"creditCards": [{"cardName": "A"}], "related_links": [], "more": [{"x": 1}]})
+    assert feed_in_chunks(text, seed) == []
+
+
+def test_missing_related_links():
+    assert feed_in_chunks(json.dumps({"creditCards": [{"cardName": "A"}]}), 0) == []
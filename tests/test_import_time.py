@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# 匯入 main 不應載入爬蟲與 Gemini 的重量級相依套件
+HEAVY_MODULES = ['selenium', 'cloudscraper', 'bs4', 'html2text', 'google.generativeai', 'requests']
+# 匯入時間上限（秒）；實測約 60 ms，保留餘裕給較慢的機器
+IMPORT_BUDGET = 0.5
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _import_main():
+    # 在新的程序中匯入，避免受到其他測試已載入模組的影響
+    output = subprocess.run([sys.executable, '-c', SCRIPT], cwd=SRC_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.splitlines()[0])
+
+
+def test_import_does_not_load_heavy_modules():
+    assert _import_main()['loaded'] == []
+
+
+def test_import_time_within_budget():
+    # 取多次中最快的一次，降低系統負載造成的誤差
+    elapsed = min(_import_main()['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"匯入 main 花費 {elapsed * 1000:.0f} ms，超過 {IMPORT_BUDGET * 1000:.0f} ms"
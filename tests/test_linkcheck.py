@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+import core.linkcheck as linkcheck
+
+
+@pytest.fixture(autouse=True)
+def cache_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(linkcheck, 'CACHE_PATH', str(tmp_path / 'link_cache.json'))
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+def test_busy_host_does_not_starve_other_hosts(monkeypatch):
+    requests = pytest.importorskip('requests')
+    order = []
+    active = {}
+    peak = {}
+    lock = threading.Lock()
+
+    class FakeSession:
+        def mount(self, *args):
+            pass
+
+        def close(self):
+            pass
+
+        def head(self, url, **kwargs):
+            host = url.split('/')[2]
+            with lock:
+                order.append(host)
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+            time.sleep(0.01)
+            with lock:
+                active[host] -= 1
+            return FakeResponse(200)
+
+    monkeypatch.setattr(requests, 'Session', FakeSession)
+    urls = [f'https://busy.example/{i}' for i in range(40)] + ['https://other.example/a']
+    results = linkcheck.check_urls(sorted(urls), max_workers=8, per_host=2)
+
+    assert all(result['ok'] for result in results.values()) and len(results) == 41
+    assert peak['busy.example'] <= 2
+    # 其他網域不需要等待忙碌網域的所有網址檢查完
+    assert order.index('other.example') < 5
+
+
+def test_validate_cards_checks_only_absolute_urls(monkeypatch):
+    checked = []
+
+    def fake_check_urls(urls, **options):
+        checked.extend(urls)
+        return {url: {'ok': 'dead' not in url, 'status': 404 if 'dead' in url else 200} for url in urls}
+
+    monkeypatch.setattr(linkcheck, 'check_urls', fake_check_urls)
+    cards = [{'cardName': 'A', 'sourceUrl': 'https://bank.example/', 'imageUrl': 'images/a.png',
+              'cardLink': 'https://bank.example/dead.htm', 'cardImage': 'https://bank.example/a.png'}]
+    linkcheck.validate_cards(cards, drop_dead=True)
+
+    assert sorted(checked) == ['https://bank.example/a.png', 'https://bank.example/dead.htm']
+    # 無法確定所在頁面的相對網址維持原樣
+    assert cards[0]['imageUrl'] == 'images/a.png'
+    assert cards[0]['cardLink'] == ''
+    assert cards[0]['linkStatus'] == {'cardLink': 404, 'cardImage': 200}
@@ -0,0 +1,41 @@
+from core.policy import YieldTracker
+
+ROOT = 'https://bank.example/'
+LIST = 'https://bank.example/cards'
+
+
+def _cards(*names):
+    return {'creditCards': [{'cardName': name} for name in names]}
+
+
+def test_child_pages_accumulate_to_ancestors():
+    tracker = YieldTracker()
+    tracker.register(LIST, ROOT)
+    # 子頁面比父頁面先完成時，仍會累加到祖先分支
+    assert tracker.add_page(LIST + '/a', LIST, _cards('鈦金卡')) == 1
+    tracker.add_page(ROOT, None, None)
+    tracker.add_page(LIST, ROOT, _cards('JCB 晶緻卡'))
+    assert tracker.should_prune(ROOT, min_yield=0.5, min_pages=3) is False
+    assert tracker.branch_yield(ROOT) == (2 + 0.5) / (3 + 1)
+
+
+def test_duplicate_cards_do_not_count_as_new():
+    tracker = YieldTracker()
+    tracker.add_page(ROOT, None, _cards('鈦金卡', 'JCB 晶緻卡'))
+    assert tracker.add_page(LIST, ROOT, _cards('鈦金卡 ', '鈦金卡')) == 0
+    assert tracker.add_page(LIST + '/b', ROOT, _cards('JCB晶緻卡')) == 0
+
+
+def test_should_prune_needs_enough_pages_and_low_yield():
+    tracker = YieldTracker()
+    tracker.add_page(ROOT, None, None)
+    for i in range(2):
+        tracker.add_page(f"{LIST}/{i}", ROOT, None)
+    assert tracker.should_prune(ROOT, min_yield=0.2, min_pages=4) is False
+    assert tracker.should_prune(ROOT, min_yield=0.2, min_pages=3) is True
+    tracker.add_page(f"{LIST}/2", ROOT, _cards('鈦金卡'))
+    # 1 張卡 / 4 頁 = 0.25
+    assert tracker.should_prune(ROOT, min_yield=0.2, min_pages=3) is False
+    assert tracker.should_prune(ROOT, min_yield=0.3, min_pages=3) is True
+    # 尚未爬取的分支不剪枝
+    assert tracker.should_prune('https://other.example/', min_yield=0.2, min_pages=0) is False
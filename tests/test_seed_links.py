@@ -0,0 +1,56 @@
+import pytest
+
+import main
+import core.storage as storage
+
+BASE = 'https://bank.example/cards'
+SEEDS = {BASE: [{'url': 'https://bank.example/cards/a', 'title': '', 'relevance': '中'},
+                {'url': 'https://bank.example/cards/b', 'title': '', 'relevance': '中'}]}
+
+
+@pytest.fixture(autouse=True)
+def pages_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'PAGES_DIR', str(tmp_path / 'pages'))
+
+
+def fake_analyze_page(user_query, url, max_links_per_page=None, priority_keywords=None, budget=None, on_link=None):
+    """起始頁面無法爬取，其餘頁面正常回傳內容"""
+    if url == BASE:
+        return None, None, []
+    return f'內容 {url}', {'creditCards': [], 'related_links': []}, []
+
+
+def _urls(node):
+    return sorted(sub_page['url'] for sub_page in node['sub_pages'])
+
+
+def test_best_first_crawls_seeds_when_base_page_fails(monkeypatch):
+    monkeypatch.setattr(main, 'analyze_page', fake_analyze_page)
+    results = main.crawl_best_first('q', [BASE], max_depth=2, seed_links=SEEDS)
+    assert results[BASE]['content'] == ''
+    assert _urls(results[BASE]) == ['https://bank.example/cards/a', 'https://bank.example/cards/b']
+
+
+def test_depth_crawl_crawls_seeds_when_base_page_fails(monkeypatch):
+    monkeypatch.setattr(main, 'analyze_page', fake_analyze_page)
+    result = main.crawl_with_depth('q', BASE, max_depth=2, seed_links=SEEDS[BASE])
+    assert result['content'] == ''
+    assert _urls(result) == ['https://bank.example/cards/a', 'https://bank.example/cards/b']
+
+
+def test_result_tree_keeps_seed_pages_of_failed_base():
+    records = [{'url': 'https://bank.example/cards/a', 'parent_url': BASE, 'title': '', 'depth': 1, 'content': 'a'}]
+    tree = main.build_result_tree(records, [BASE])
+    assert _urls(tree[BASE]) == ['https://bank.example/cards/a']
+
+
+def test_feed_urls_are_passed_to_sitemap_discovery(monkeypatch):
+    calls = {}
+
+    def fake_discover(base_url, priority_keywords=None, path_patterns=None, feed_urls=None, **kwargs):
+        calls[base_url] = feed_urls
+        return []
+
+    monkeypatch.setattr(main.sitemap, 'discover_urls', fake_discover)
+    main.discover_seed_links([BASE], feed_urls={BASE: ['https://bank.example/news.rss']})
+    assert calls == {BASE: ['https://bank.example/news.rss']}
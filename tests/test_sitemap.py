@@ -0,0 +1,56 @@
+import gzip
+import io
+
+import pytest
+
+import core.sitemap as sitemap
+
+INDEX = b"""<?xml version="1.0"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://bank.example/cards.xml</loc></sitemap>
+  <sitemap><loc>https://bank.example/broken.xml.gz</loc></sitemap>
+</sitemapindex>"""
+
+CARDS = b"""<?xml version="1.0"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://bank.example/credit-card/a</loc></url>
+  <url><loc>https://bank.example/about</loc></url>
+  <url><loc>https://other.example/credit-card/b</loc></url>
+</urlset>"""
+
+
+class FailingStream(io.BytesIO):
+    """讀到一半連線中斷的串流"""
+
+    def read(self, *args):
+        raise OSError("連線中斷")
+
+
+def test_broken_child_sitemap_keeps_found_urls(monkeypatch):
+    streams = {
+        'https://bank.example/sitemap.xml': lambda: io.BytesIO(INDEX),
+        'https://bank.example/cards.xml': lambda: io.BytesIO(CARDS),
+        'https://bank.example/broken.xml.gz': lambda: FailingStream(),
+    }
+    monkeypatch.setattr(sitemap, 'find_sitemaps', lambda base_url: ['https://bank.example/sitemap.xml'])
+    monkeypatch.setattr(sitemap, '_open_stream', lambda url, timeout=20: streams[url]())
+    assert sitemap.discover_urls('https://bank.example/') == ['https://bank.example/credit-card/a']
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self.raw = io.BytesIO(body)
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('body', [CARDS, gzip.compress(CARDS)])
+def test_gz_sitemap_detected_by_content(monkeypatch, body):
+    requests = pytest.importorskip('requests')
+    # 伺服器已解壓縮的 .gz 與真正的 gzip 內容都能解析
+    monkeypatch.setattr(requests, 'get', lambda url, **kwargs: FakeResponse(body))
+    entries = list(sitemap.iter_entries('https://bank.example/cards.xml.gz'))
+    assert ('page', 'https://bank.example/credit-card/a') in entries
@@ -0,0 +1,80 @@
+import json
+import os
+from collections import OrderedDict
+
+import pytest
+
+import main
+import core.storage as storage
+
+
+@pytest.fixture(autouse=True)
+def work_dir(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, 'PAGES_DIR', str(tmp_path / 'data' / 'pages'))
+    monkeypatch.setattr(storage, '_memory_cache', OrderedDict())
+    monkeypatch.setattr(storage, '_memory_bytes', 0)
+    monkeypatch.setattr(storage, '_max_memory_bytes', 64 * 1024 * 1024)
+
+
+def _page_files():
+    return [name for _, _, files in os.walk(storage.PAGES_DIR) for name in files]
+
+
+def test_manifest_round_trip_loads_pages_lazily():
+    result = {
+        'url': 'https://bank.example/',
+        'content': '首頁內容',
+        'sub_pages': [{'url': 'https://bank.example/a', 'title': 'A',
+                       'content': {'url': 'https://bank.example/a', 'content': '卡片 A', 'sub_pages': []}}],
+    }
+    filename = main.save_crawl_result(result, 'data/crawl_result_test.json')
+    with open(filename, encoding='utf-8') as f:
+        manifest = json.load(f)
+    # 清單檔中只有雜湊值，沒有頁面內容
+    assert storage.is_manifest(manifest)
+    assert '首頁內容' not in json.dumps(manifest, ensure_ascii=False)
+
+    loaded = main.load_crawl_result(filename)
+    assert isinstance(loaded['content'], storage.PageRef)
+    assert str(loaded['content']) == '首頁內容'
+    assert str(loaded['sub_pages'][0]['content']['content']) == '卡片 A'
+    assert main.combine_content(loaded) == main.combine_content(result)
+
+
+def test_identical_pages_are_stored_once():
+    first = storage.put_page('相同內容')
+    second = storage.put_page('相同內容')
+    assert first == second
+    storage.save_manifest([{'url': 'a', 'content': '相同內容'}, {'url': 'b', 'content': first}], 'manifest.json')
+    assert len(_page_files()) == 1
+
+
+def test_legacy_full_json_still_loads():
+    legacy = [{'url': 'https://bank.example/', 'content': '舊格式內容', 'sub_pages': []}]
+    os.makedirs('data', exist_ok=True)
+    with open('data/crawl_result_legacy.json', 'w', encoding='utf-8') as f:
+        json.dump(legacy, f, ensure_ascii=False)
+    # 舊格式的單元素列表會被展開，內容直接是字串
+    assert main.load_crawl_result('data/crawl_result_legacy.json') == legacy[0]
+
+
+def test_memory_cache_stays_within_limit_and_reloads_from_disk():
+    storage.set_memory_limit(100)
+    refs = [storage.put_page(f'{i}' * 40) for i in range(3)]
+    assert storage._memory_bytes <= 100
+    # 最久未使用的頁面被淘汰，但仍可從磁碟讀回
+    assert refs[0].content_hash not in storage._memory_cache
+    assert str(refs[0]) == '0' * 40
+    assert refs[0].content_hash in storage._memory_cache
+    assert refs[1].content_hash not in storage._memory_cache
+    assert storage._memory_bytes <= 100
+
+    # 超過上限的單一頁面不放入快取
+    big = storage.put_page('x' * 500)
+    assert big.content_hash not in storage._memory_cache
+    assert str(big) == 'x' * 500
+
+    storage.set_memory_limit(0)
+    assert storage._memory_bytes == 0 and not storage._memory_cache
+    assert [str(ref) for ref in refs] == [f'{i}' * 40 for i in range(3)]